@@ -17,13 +17,12 @@ def all_packages():
     """
     exclude = ('dev', 'tests')
     packages = find_packages(exclude=exclude)
-    # Make a list of lists of packages (i.e. each invocation of find_packages
-    # returns a list).
-    libs = [find_packages(path, exclude=exclude) for path in find_lib_paths()]
-    # Use ``sum`` to concatenate the list of lists. This works because the
-    # initial value is a list, when "adding" a list, its ``__add__`` operator
-    # concatenates the list to the initial value.
-    return packages+sum(libs, [])
+    # Each invocation of find_packages returns a list, extend our list with
+    # them instead of concatenating them with ``sum``, which would create a
+    # new list for every lib.
+    for path in find_lib_paths():
+        packages.extend(find_packages(path, exclude=exclude))
+    return packages
 
 
 setup(
@@ -41,13 +40,9 @@ setup(
     package_dir=find_lib_path_dict(),
     python_requires='!=3.0.*, !=3.1.*, !=3.2.*, <4',
     install_requires=[
-        'python-daemon>=2.2.3',
-        'configargparse>=0.14.0',
         # Required by deps in `stapled/libs`
         'future>=0.17.1',
         'cffi>=1.12.3',
-        # Required for python-daemon (package dep not specified)
-        'docutils>=0.15.2',
     ],
     extras_require={
         'docs': [
@@ -29,12 +29,18 @@ user's process hierarchy node. In any case, it starts up the
 :mod:`stapled.core.daemon`
 module to bootstrap the application.
 """
+import argparse
+import atexit
+import fnmatch
+import functools
 import logging
 import logging.handlers
 import os
+import queue
+import re
+import socket
 import sys
-import configargparse
-import daemon
+from collections import defaultdict
 import stapled
 import stapled.core.daemon
 import stapled.core.excepthandler
@@ -44,6 +50,10 @@ from stapled.colourlog import ColourFormatter
 from stapled.version import __version__, __app_name__
 from stapled.util.functions import unique
 from stapled.util.exitcode import ExitCodeTracker
+from stapled.util.config import find_config_file
+from stapled.util.config import parse_config_file
+from stapled.util.config import config_to_args
+from stapled.util.daemonise import daemonise
 
 #: :attr:`logging.format` format string for log files and syslog
 LOGFORMAT = (
@@ -58,21 +68,26 @@ COLOUR_LOGFORMAT = (
 
 TIMESTAMP_FORMAT = "%b %d %H:%M:%S"
 
+#: Matches ignore patterns that look like relative paths, e.g. ``./cert.pem``
+#: and ``../certs/*.crt``.
+REL_PATH_PATTERN = re.compile(r'^\.+\/')
+
 logger = logging.getLogger('stapled')
 
 
+@functools.lru_cache(maxsize=1)
 def get_cli_arg_parser():
     """
     Make a CLI argument parser and return it.
 
     It does not parse the arguments because a plain parser object is used for
-    documentation purposes.
+    documentation purposes. The parser is only built once, subsequent calls
+    return the same object.
 
     :return: Argument parser with all of stapled's options configured
     :rtype: argparse.ArgumentParser
     """
-    parser = configargparse.ArgParser(
-        default_config_files=stapled.DEFAULT_CONFIG_FILE_LOCATIONS,
+    parser = argparse.ArgumentParser(
         description=(
             "Update OCSP staples from CA\'s and store the result so "
             "HAProxy can serve them to clients.\n"
@@ -87,11 +102,10 @@ def get_cli_arg_parser():
         ),
         prog=__app_name__
     )
-    parser.add(
+    parser.add_argument(
         '-c',
         '--config',
         required=False,
-        is_config_file=True,
         help=(
             "Override the default config file locations "
             "(default={})".format(
@@ -99,7 +113,7 @@ def get_cli_arg_parser():
             )
         )
     )
-    parser.add(
+    parser.add_argument(
         '--minimum-validity',
         type=int,
         default=7200,
@@ -108,14 +122,14 @@ def get_cli_arg_parser():
             "attempt will be made to get a new, valid staple (default: 7200)."
         )
     )
-    parser.add(
+    parser.add_argument(
         '-t',
         '--renewal-threads',
         type=int,
         default=2,
         help="Amount of threads to run for renewing staples. (default=2)"
     )
-    parser.add(
+    parser.add_argument(
         '--verbosity',
         type=int,
         default=0,
@@ -124,7 +138,7 @@ def get_cli_arg_parser():
             "can be overridden by the ``-v`` argument."
         )
     )
-    parser.add(
+    parser.add_argument(
         '-v',
         action='count',
         dest="verbose",
@@ -133,7 +147,7 @@ def get_cli_arg_parser():
             "``verbosity`` argument if provided."
         )
     )
-    parser.add(
+    parser.add_argument(
         '-D',
         '--daemon',
         action='store_true',
@@ -143,7 +157,7 @@ def get_cli_arg_parser():
             "under new process group."
         )
     )
-    parser.add(
+    parser.add_argument(
         '--interactive',
         '--no-daemon',
         action='store_false',
@@ -153,7 +167,7 @@ def get_cli_arg_parser():
             "config file, effectively starting interactive mode."
         )
     )
-    parser.add(
+    parser.add_argument(
         '--file-extensions',
         type=str,
         default=stapled.FILE_EXTENSIONS_DEFAULT,
@@ -162,7 +176,7 @@ def get_cli_arg_parser():
             "list (default: crt,pem,cer)."
         )
     )
-    parser.add(
+    parser.add_argument(
         '-r',
         '--refresh-interval',
         type=int,
@@ -170,7 +184,18 @@ def get_cli_arg_parser():
         help="Minimum time to wait between parsing cert dirs and "
         "certificates (default=60)."
     )
-    parser.add(
+    parser.add_argument(
+        '--inotify',
+        action='store_true',
+        default=False,
+        help=(
+            "Watch the cert paths with inotify and refresh as soon as a "
+            "certificate is added, changed or removed instead of waiting for "
+            "the next refresh. The --refresh-interval is still used as a "
+            "fallback. Only available on Linux."
+        )
+    )
+    parser.add_argument(
         '-l',
         '--logdir',
         type=str,
@@ -181,19 +206,19 @@ def get_cli_arg_parser():
               "another directory. Traces of unexpected exceptions are placed "
               "here as well.".format(stapled.LOG_DIR))
     )
-    parser.add(
+    parser.add_argument(
         '--syslog',
         action='store_true',
         default=False,
         help="Output to syslog."
     )
-    parser.add(
+    parser.add_argument(
         '-q',
         '--quiet',
         action='store_true',
         help="Don't print messages to stdout."
     )
-    parser.add(
+    parser.add_argument(
         '-s',
         '--haproxy-sockets',
         type=str,
@@ -215,7 +240,7 @@ def get_cli_arg_parser():
             "/etc/haproxy2.sock``"
         )
     )
-    parser.add(
+    parser.add_argument(
         '--no-haproxy-sockets',
         action='store_true',
         help=(
@@ -223,7 +248,7 @@ def get_cli_arg_parser():
             "specified in the config file."
         )
     )
-    parser.add(
+    parser.add_argument(
         '--haproxy-socket-keepalive',
         type=int,
         default=10,
@@ -236,7 +261,7 @@ def get_cli_arg_parser():
             "accepted value."
         )
     )
-    parser.add(
+    parser.add_argument(
         '--haproxy-config',
         type=str,
         nargs='+',
@@ -250,7 +275,7 @@ def get_cli_arg_parser():
             " space. See ``--haproxy-sockets`` for more information."
         )
     )
-    parser.add(
+    parser.add_argument(
         '-p',
         '--cert-paths',
         default=[],
@@ -262,20 +287,20 @@ def get_cli_arg_parser():
             "separated by a space."
         )
     )
-    parser.add(
+    parser.add_argument(
         '-R',
         '--recursive',
         action='store_true',
         default=False,
         help="Recursively scan given paths."
     )
-    parser.add(
+    parser.add_argument(
         '--no-recycle',
         action='store_true',
         default=False,
         help="Don't re-use existing staples, force renewal."
     )
-    parser.add(
+    parser.add_argument(
         '-i',
         '--ignore',
         type=str,
@@ -296,7 +321,7 @@ def get_cli_arg_parser():
             "will cause a warning and will be ignored."
         )
     )
-    parser.add(
+    parser.add_argument(
         '-V', '--version',
         action='version',
         version="%(app_name)s v%(version)s" % {
@@ -304,7 +329,7 @@ def get_cli_arg_parser():
         },
         help="Show the version number and exit."
     )
-    parser.add(
+    parser.add_argument(
         '-d',
         '--directories',
         default=[],
@@ -314,7 +339,7 @@ def get_cli_arg_parser():
             "DEPRECATED, please see ``--cert-paths``."
         )
     )
-    parser.add(
+    parser.add_argument(
         '--one-off',
         action='store_true',
         default=False,
@@ -324,6 +349,17 @@ def get_cli_arg_parser():
             "--no-daemon arguments are also ignored."
         )
     )
+    parser.add_argument(
+        '--cpu-affinity',
+        type=str,
+        default=None,
+        metavar="CPUS",
+        help=(
+            "Only run stapled on these CPUs, comma separated list of CPU "
+            "numbers or ranges, e.g. ``2,3`` or ``0-3,6``. Can be used to "
+            "keep stapled off the CPUs HAProxy runs on."
+        )
+    )
     return parser
 
 
@@ -335,71 +371,89 @@ def init():
     :func:`stapled.core.daemon.run()` either in daemonised mode if the ``-d``
     argument was supplied, or in the current context if ``-d`` wasn't supplied.
     """
-    args = __get_validated_args()
+    # Relative paths are relative to the directory stapled was started in.
+    cwd = os.getcwd()
+    args = __get_validated_args(cwd)
 
-    log_file_handles, exit_code_tracker = __init_logging(args)
+    log_file_handles, exit_code_tracker, log_listener = __init_logging(args)
 
-    # Get a mapping of configured sockets and certificate directories from:
-    # haproxy config, stapled config and command line arguments
-    haproxy_socket_mapping = __get_haproxy_socket_mapping(args)
-
-    # Now sockets' keys are the merged cert paths from arguments and haproxy
-    # config files, de-duplicated.
-    cert_paths = haproxy_socket_mapping.keys()
-
-    # Determine if we need to start a staple adder thread.
-    if args.no_haproxy_sockets or not any(haproxy_socket_mapping.values()):
-        haproxy_socket_mapping = None
+    # Compile the ignore patterns once so the finder doesn't have to evaluate
+    # every glob pattern for every file it finds.
+    ignore = __get_ignore_pattern(args)
 
     daemon_kwargs = dict(
-        cert_paths=cert_paths,
-        haproxy_socket_mapping=haproxy_socket_mapping,
         haproxy_socket_keepalive=args.haproxy_socket_keepalive,
-        file_extensions=args.file_extensions,
+        file_extensions=__get_file_extensions(args),
         renewal_threads=args.renewal_threads,
         refresh_interval=args.refresh_interval,
         one_off=args.one_off,
         minimum_validity=args.minimum_validity,
         recursive=args.recursive,
+        inotify=args.inotify,
         no_recycle=args.no_recycle,
-        ignore=args.ignore,
-        exit_code_tracker=exit_code_tracker
+        ignore=ignore,
+        exit_code_tracker=exit_code_tracker,
+        reload_callback=functools.partial(__get_reloadable_kwargs, cwd)
     )
+    daemon_kwargs.update(__get_paths_and_sockets(args, cwd))
 
     if stapled.LOCAL_LIB_MODE:
         logger.info("Running on local libs.")
+    if args.cpu_affinity:
+        __set_cpu_affinity(args.cpu_affinity)
     if args.daemon:
         logger.info("Daemonising now..")
-        with daemon.DaemonContext(files_preserve=log_file_handles):
-            stapled.core.daemon.Stapledaemon(**daemon_kwargs)
+        # Threads don't survive forking, so stop the log listener and start
+        # it again in the daemon.
+        if log_listener is not None:
+            __stop_log_listener(log_listener)
+        daemonise(files_preserve=log_file_handles)
+        if log_listener is not None:
+            log_listener.start()
+        stapled.core.daemon.Stapledaemon(**daemon_kwargs)
     else:
         logger.info("Running interactively..")
         stapled.core.daemon.Stapledaemon(**daemon_kwargs)
 
 
-def __get_arg_haproxy_sockets(args):
+def __set_cpu_affinity(cpus):
+    """
+    Restrict the process and the threads it will start to a set of CPUs.
+
+    :param set cpus: CPU numbers the process may run on.
+    """
+    if not hasattr(os, 'sched_setaffinity'):
+        logger.warning(
+            "Setting the CPU affinity is not supported on this platform.")
+        return
+    logger.info("Setting CPU affinity to CPUs: %s", sorted(cpus))
+    os.sched_setaffinity(0, cpus)
+
+
+def __get_arg_haproxy_sockets(args, cwd):
     """
     Parse the haproxy_sockets argument.
 
     :param Namespace args: Argparser argument list.
+    :param str cwd: Current working directory to resolve relative paths.
     """
     if args.haproxy_sockets:
-        if len(args.cert_paths) != len(args.haproxy_sockets):
-            raise ValueError(
-                "Number of sockets does not equal number of certificate paths."
-            )
         # Get socket paths as an array or arrays of as absolute paths.
-        return [[os.path.abspath(path)] for path in args.haproxy_sockets]
+        return [
+            [__get_absolute_path(path, cwd)] for path in args.haproxy_sockets
+        ]
     # If no sockets are set we need to return an equal amount of empty arrays
-    # to the amount of certificate paths.
-    return [[]] * len(args.cert_paths)
+    # to the amount of certificate paths. Separate lists, so extending one
+    # doesn't extend them all.
+    return [[] for _ in args.cert_paths]
 
 
-def __get_arg_cert_paths(args):
+def __get_arg_cert_paths(args, cwd):
     """
     Parse the cert_paths argument.
 
     :param Namespace args: Argparser argument list.
+    :param str cwd: Current working directory to resolve relative paths.
     """
     # Warn about deprecated arguments..
     if args.directories:
@@ -416,17 +470,114 @@ def __get_arg_cert_paths(args):
             )
         # Make stuff not break after an update.
         args.cert_paths = args.directories
-    # Get certificate path arguments as absolute paths.
-    return [os.path.abspath(path) for path in args.cert_paths]
+    # Get certificate path arguments as canonical absolute paths.
+    return [__get_canonical_path(path, cwd) for path in args.cert_paths]
+
+
+def __get_absolute_path(path, cwd):
+    """
+    Get the absolute path of ``path``, expanding ``~`` to the home directory.
+
+    Unlike :func:`os.path.abspath` this does not look up the current working
+    directory for every path.
+
+    :param str path: A file or directory path.
+    :param str cwd: Current working directory to resolve relative paths.
+    :return str: Normalised absolute path.
+    """
+    if path.startswith('~'):
+        path = os.path.expanduser(path)
+    if not path.startswith('/'):
+        path = os.path.join(cwd, path)
+    return os.path.normpath(path)
+
+
+@functools.lru_cache(maxsize=None)
+def __get_canonical_path(path, cwd):
+    """
+    Get a canonical version of a certificate path so duplicates can be found.
+
+    Directories are resolved to their real path. Files are only made absolute
+    because HAProxy expects the staple next to the configured file, which is
+    often a symlink (e.g. Let's Encrypt's ``live`` directory).
+
+    Results are cached, paths often occur in several HAProxy config files and
+    resolving them requires file system access.
+
+    :param str path: A certificate file or directory path.
+    :param str cwd: Current working directory to resolve relative paths.
+    :return str: Canonical absolute path.
+    """
+    path = __get_absolute_path(path, cwd)
+    if os.path.isdir(path):
+        return os.path.realpath(path)
+    return path
+
+
+def __get_file_extensions(args):
+    """
+    Parse the file_extensions argument into a set for fast lookups.
+
+    :param Namespace args: Argparser argument list.
+    :return frozenset: Lower case file extensions without leading dots.
+    """
+    extensions = (
+        ext.strip().lstrip(".").lower()
+        for ext in args.file_extensions.split(",")
+    )
+    return frozenset(ext for ext in extensions if ext)
+
+
+def __get_ignore_pattern(args):
+    """
+    Compile the ignore argument into a single regular expression.
+
+    Patterns that start with ``/`` are absolute, other patterns are matched
+    against the last part of found files. Patterns that look like relative
+    paths are skipped with a warning.
+
+    :param Namespace args: Argparser argument list.
+    :return re.Pattern|NoneType: Compiled pattern or None if nothing should be
+        ignored.
+    """
+    patterns = []
+    for pattern in args.ignore or []:
+        pattern = pattern.strip()
+        if not pattern:
+            continue
+        # Filter out patterns that look like relative paths, e.g.:
+        # ./cert.pem and ../certs/*.crt, i.e. starts with one or more
+        # ``.`` followed by ``/``.
+        if REL_PATH_PATTERN.match(pattern) is not None:
+            logger.warning(
+                "Pattern %s seems to be a relative path, rather than a "
+                "pattern, ignoring this pattern.",
+                pattern
+            )
+            continue
+        # If pattern starts with / it is absolute, do nothing, if not, add
+        # ``*`` to make it match any parent directory.
+        if not pattern.startswith('/'):
+            pattern = "*{}".format(pattern)
+        patterns.append("(?:{})".format(fnmatch.translate(pattern)))
+    if not patterns:
+        return None
+    return re.compile("|".join(patterns))
 
 
 def __init_logging(args):
     """
     Initialise the logging module.
 
+    Records are put in a queue and written by the handlers in a listener
+    thread, so threads don't have to wait for log files or syslog.
+
     :param Namespace args: Argparser argument list.
+    :return tuple: Files to keep open when daemonising, the exit code tracker
+        or None and the started queue listener or None.
     """
     log_file_handles = []
+    handlers = []
     verbose = args.verbose or args.verbosity
     log_level = max(min(50 - verbose * 10, 50), 10)
     logging.basicConfig()
@@ -434,101 +585,281 @@ def __init_logging(args):
     # Don't allow dependencies to log anything but fatal errors
     logging.getLogger("urllib3").setLevel(logging.FATAL)
     logger.setLevel(level=log_level)
+    # File and syslog handlers can share the same formatter.
+    formatter = logging.Formatter(LOGFORMAT, TIMESTAMP_FORMAT)
 
     if not args.quiet and not args.daemon:
         console_handler = logging.StreamHandler()
         console_handler.setLevel(log_level)
-        console_handler.setFormatter(
-            ColourFormatter(COLOUR_LOGFORMAT, TIMESTAMP_FORMAT)
-        )
-        logger.addHandler(console_handler)
+        # Only use colours on a terminal, not when output is redirected to a
+        # file or a log collector such as journald.
+        if console_handler.stream.isatty():
+            console_handler.setFormatter(
+                ColourFormatter(COLOUR_LOGFORMAT, TIMESTAMP_FORMAT)
+            )
+        else:
+            console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
     if args.logdir:
+        # The working directory changes when daemonising.
+        args.logdir = os.path.abspath(args.logdir)
+        # Make sure the log directory exists on a fresh install.
+        os.makedirs(args.logdir, exist_ok=True)
+        if not os.access(args.logdir, os.W_OK):
+            raise PermissionError(
+                "Log directory {} is not writeable.".format(args.logdir)
+            )
+        # Only critical messages are logged by default, so don't open the log
+        # file until the first message is emitted.
         file_handler = logging.FileHandler(
-            os.path.join(args.logdir, 'stapled.log'))
-        file_handler.setLevel(log_level)
-        file_handler.setFormatter(
-            logging.Formatter(LOGFORMAT, TIMESTAMP_FORMAT)
+            os.path.join(args.logdir, 'stapled.log'),
+            encoding='utf-8',
+            delay=log_level >= logging.CRITICAL
         )
-        logger.addHandler(file_handler)
-        log_file_handles.append(file_handler.stream)
+        file_handler.setLevel(log_level)
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+        if file_handler.stream is not None:
+            log_file_handles.append(file_handler.stream)
         stapled.core.excepthandler.LOG_DIR = args.logdir
     if args.syslog:
-        syslog_handler = logging.handlers.SysLogHandler(address='/dev/log')
+        syslog_handler = logging.handlers.SysLogHandler(
+            address='/dev/log',
+            socktype=socket.SOCK_DGRAM
+        )
         syslog_handler.setLevel(log_level)
-        syslog_handler.setFormatter(
-            logging.Formatter(LOGFORMAT, TIMESTAMP_FORMAT)
+        syslog_handler.setFormatter(formatter)
+        # Keep the syslog socket open when daemonising.
+        log_file_handles.append(syslog_handler.socket)
+        handlers.append(syslog_handler)
+    if handlers:
+        log_queue = queue.Queue()
+        logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        log_listener = logging.handlers.QueueListener(
+            log_queue, *handlers, respect_handler_level=True
         )
-        logger.addHandler(syslog_handler)
+        log_listener.start()
+        # Write queued records before exiting.
+        atexit.register(__stop_log_listener, log_listener)
+    else:
+        # Nothing will be output, without a handler the logging module would
+        # fall back to printing warnings and errors to stderr.
+        logger.addHandler(logging.NullHandler())
+        log_listener = None
     if args.one_off:
         # Keep track of errors so we can return a greater than 0 exit code when
-        # errors occurred.
+        # errors occurred. This is not queued so the count is up to date when
+        # we exit.
         exit_code_tracker = ExitCodeTracker(logging.WARN)
         logger.addHandler(exit_code_tracker)
     else:
         exit_code_tracker = None
-    return log_file_handles, exit_code_tracker
+    return log_file_handles, exit_code_tracker, log_listener
 
 
-def __get_haproxy_socket_mapping(args):
+def __stop_log_listener(log_listener):
+    """
+    Stop the log queue listener after it handled all queued records.
+
+    :param logging.handlers.QueueListener log_listener: The listener to stop.
+    """
+    # pylint: disable=protected-access
+    if log_listener._thread is not None:
+        log_listener.stop()
+
+
+def __get_haproxy_socket_mapping(args, cwd):
     """
     Get a mapping of configured sockets and certificate directories.
 
     From: haproxy config, stapled config and command line arguments.
 
     :param Namespace args: Argparser argument list.
+    :param str cwd: Current working directory to resolve relative paths.
     :return dict Of cert-paths and sockets for inform of changes.
     """
     # Parse the cert_paths argument
-    arg_cert_paths = __get_arg_cert_paths(args)
+    arg_cert_paths = __get_arg_cert_paths(args, cwd)
     # Parse haproxy_sockets argument.
-    arg_haproxy_sockets = __get_arg_haproxy_sockets(args)
-    # Make a mapping from certificate paths to sockets in a dict.
-    mapping = dict(zip(arg_cert_paths, arg_haproxy_sockets))
+    arg_haproxy_sockets = __get_arg_haproxy_sockets(args, cwd)
+    # Make a mapping from certificate paths to sockets in a dict, paths that
+    # are passed more than once are mapped to the sockets of all occurrences.
+    mapping = defaultdict(list)
+    for path, sockets in zip(arg_cert_paths, arg_haproxy_sockets):
+        mapping[path].extend(sockets)
 
     # Parse HAProxy config files.
     try:
-        conf_cert_paths, conf_haproxy_sockets = parse_haproxy_config(
-            args.haproxy_config
-        )
+        conf_cert_paths, conf_haproxy_sockets = parse_haproxy_config([
+            __get_absolute_path(path, cwd) for path in args.haproxy_config
+        ])
     except (OSError) as exc:
         logger.critical(exc)
         exit(1)
 
     # Combine the socket and certificate paths of the arguments and config
     # files in the sockets dictionary.
-    for i, paths in enumerate(conf_cert_paths):
+    for paths, sockets in zip(conf_cert_paths, conf_haproxy_sockets):
+        if args.no_haproxy_sockets:
+            # haproxy_sockets are disabled, just ensure the paths are in the
+            # mapping without sockets.
+            sockets = []
         for path in paths:
-            # When certificate path is already in the mapping add the socket
-            # file to the mapping if haproxy_sockets is not disabled.
-            if args.no_haproxy_sockets:
-                # haproxy_sockets are disabled, just ensure the path is in the
-                # mapping without sockets.
-                mapping[path] = []
-            else:
-                # Make sure paths are mapped to all unique sockets.
-                mapping[path] = unique(
-                    mapping.get(path, []) + conf_haproxy_sockets[i],
-                    preserve_order=False
-                )
-    logger.debug("Paths to socket mappings: %s", str(mapping))
+            # Overlapping paths from different config files and arguments
+            # should only be scanned once.
+            path = __get_canonical_path(path, cwd)
+            mapping[path].extend(sockets)
+    # Make sure paths are mapped to all unique sockets.
+    mapping = dict(
+        (path, unique(sockets)) for path, sockets in mapping.items()
+    )
+    logger.debug("Paths to socket mappings: %s", mapping)
     return mapping
 
 
-def __get_validated_args():
+def __get_paths_and_sockets(args, cwd):
+    """
+    Get the certificate paths and the HAProxy socket mapping.
+
+    :param argparse.Namespace args: Parsed arguments.
+    :param str cwd: Current working directory to resolve relative paths.
+    :return dict: ``cert_paths`` and ``haproxy_socket_mapping`` keyword
+        arguments for :class:`stapled.core.daemon.Stapledaemon`.
+    """
+    # Get a mapping of configured sockets and certificate directories from:
+    # haproxy config, stapled config and command line arguments
+    haproxy_socket_mapping = __get_haproxy_socket_mapping(args, cwd)
+
+    # Now sockets' keys are the merged cert paths from arguments and haproxy
+    # config files, de-duplicated. Take a copy so the paths don't change with
+    # the mapping.
+    cert_paths = tuple(haproxy_socket_mapping.keys())
+
+    # Determine if we need to start a staple adder thread.
+    if args.no_haproxy_sockets or not any(haproxy_socket_mapping.values()):
+        haproxy_socket_mapping = None
+    return dict(
+        cert_paths=cert_paths,
+        haproxy_socket_mapping=haproxy_socket_mapping
+    )
+
+
+def __get_reloadable_kwargs(cwd):
+    """
+    Read the arguments, config file and HAProxy config files again.
+
+    Used by the daemon to reload its configuration on ``SIGHUP``.
+
+    :param str cwd: The directory stapled was started in, relative paths in
+        the arguments are relative to it, not to the daemon's working
+        directory.
+    :return dict: See :func:`__get_paths_and_sockets`.
+    :raises ArgumentError: If the new configuration is invalid.
+    """
+    # Directories may have been replaced by symlinks or vice versa.
+    __get_canonical_path.cache_clear()
+    try:
+        return __get_paths_and_sockets(__get_validated_args(cwd), cwd)
+    except SystemExit:
+        # Argument and config errors are logged and exit the process at start
+        # up, a running daemon should keep running.
+        raise ArgumentError("Invalid arguments or configuration.")
+
+
+def __get_config_file_args(parser, cwd):
+    """
+    Read the config file and convert its settings to command line arguments.
+
+    The config file passed with ``-c`` is used if it is set, otherwise the
+    first existing file in :attr:`stapled.DEFAULT_CONFIG_FILE_LOCATIONS`.
+
+    :param argparse.ArgumentParser parser: Parser to convert the settings for.
+    :param str cwd: Current working directory to resolve relative paths.
+    :return list: Command line arguments from the config file.
+    :raises ValueError: If the config file contains invalid settings.
+    :raises OSError: If the config file can't be read.
+    """
+    config_parser = argparse.ArgumentParser(add_help=False)
+    config_parser.add_argument('-c', '--config')
+    config_file = config_parser.parse_known_args()[0].config
+    if config_file is None:
+        config_file = find_config_file(stapled.DEFAULT_CONFIG_FILE_LOCATIONS)
+    else:
+        config_file = __get_absolute_path(config_file, cwd)
+    if config_file is None:
+        return []
+    return config_to_args(parse_config_file(config_file), parser)
+
+
+def __parse_cpu_list(cpu_list):
+    """
+    Parse a comma separated list of CPU numbers and ranges, e.g. ``0-3,6``.
+
+    :param str cpu_list: List of CPU numbers and ranges.
+    :return set: CPU numbers.
+    :raises ArgumentError: If the list can't be parsed or contains CPUs that
+        are not available to the process.
+    """
+    cpus = set()
+    try:
+        for part in cpu_list.split(","):
+            first, _, last = part.strip().partition("-")
+            cpus.update(range(int(first), int(last or first) + 1))
+    except ValueError:
+        raise ArgumentError(
+            "`--cpu-affinity` should be a list of CPUs such as ``0-3,6``."
+        )
+    if not cpus:
+        raise ArgumentError("`--cpu-affinity` should contain at least 1 CPU.")
+    if hasattr(os, 'sched_getaffinity'):
+        unavailable = cpus - os.sched_getaffinity(0)
+        if unavailable:
+            raise ArgumentError(
+                "`--cpu-affinity` contains CPUs stapled can't run on: "
+                "{}.".format(", ".join(str(cpu) for cpu in sorted(
+                    unavailable
+                )))
+            )
+    return cpus
+
+
+def __get_validated_args(cwd):
     """
     Check that arguments make sense.
 
     Checks should match the restrictions in the usage help messages.
 
+    :param str cwd: Current working directory to resolve relative paths.
     :returns Namespace: Validated argparser argument list.
     """
     parser = get_cli_arg_parser()
-    args = parser.parse_args()
+    try:
+        config_args = __get_config_file_args(parser, cwd)
+    except (OSError, ValueError) as exc:
+        parser.print_usage(sys.stderr)
+        logger.critical("Invalid config file: %s", exc)
+        exit(1)
+    # Command line arguments come last so they override the config file.
+    args = parser.parse_args(config_args + sys.argv[1:])
     try:
         if args.haproxy_socket_keepalive < 1:
             raise ArgumentError(
                 "`--haproxy-socket-keepalive` should be 1 or higher."
             )
+        if args.renewal_threads < 1:
+            raise ArgumentError("`--renewal-threads` should be 1 or higher.")
+        if args.minimum_validity < 0:
+            raise ArgumentError("`--minimum-validity` can't be negative.")
+        if args.refresh_interval < 0:
+            raise ArgumentError("`--refresh-interval` can't be negative.")
+        cert_paths = args.cert_paths or args.directories
+        if args.haproxy_sockets and \
+                len(cert_paths) != len(args.haproxy_sockets):
+            raise ArgumentError(
+                "Number of sockets does not equal number of certificate paths."
+            )
+        if args.cpu_affinity:
+            args.cpu_affinity = __parse_cpu_list(args.cpu_affinity)
     except ArgumentError as exc:
         parser.print_usage(sys.stderr)
         logger.critical("Invalid command line argument or value: %s", exc)
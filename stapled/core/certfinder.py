@@ -18,6 +18,11 @@ It also keeps track of the following:
   from the cache in :attr:`stapled.core.daemon.run.models`. Any scheduled
   actions for deleted files are cancelled.
 
+- With ``inotify=True`` the scanned paths are watched for changes with
+  inotify and a refresh is started as soon as something changes, instead of
+  only every ``refresh_interval`` seconds. The interval is still used as a
+  fallback, e.g. for changes in symlinked directories that aren't watched.
+
 The cache of parsed files is volatile so every time the process is killed
 files need to be indexed again (thus files are considered "new").
 """
@@ -25,16 +30,26 @@ files need to be indexed again (thus files are considered "new").
 import threading
 import time
 import logging
-import fnmatch
 import os
 import errno
 from stapled.core.excepthandler import stapled_except_handle
 from stapled.core.taskcontext import StapleTaskContext
 from stapled.core.certmodel import CertModel
-from stapled.util.cache import cache
+from stapled.util import inotify
 
 LOG = logging.getLogger(__name__)
 
+#: Changes in watched paths that cause a refresh.
+WATCH_MASK = (
+    inotify.IN_CLOSE_WRITE | inotify.IN_ATTRIB | inotify.IN_CREATE |
+    inotify.IN_DELETE | inotify.IN_MOVED_FROM | inotify.IN_MOVED_TO |
+    inotify.IN_DELETE_SELF | inotify.IN_MOVE_SELF
+)
+
+#: Seconds to wait after a change before refreshing, so whatever is writing
+#: certificates can finish first.
+CHANGE_DELAY = 1
+
 
 class CertFinderThread(threading.Thread):
     """
@@ -60,18 +75,28 @@ class CertFinderThread(threading.Thread):
             object where we add new parse tasks to. **(required)**.
         :kwarg int refresh_interval: The minimum amount of time (s) between
             search runs. Set to None (default) to run once **(optional)**.
-        :kwarg array file_extensions: An array containing the file extensions
-            of file types to check for certificate content **(optional)**.
+        :kwarg frozenset file_extensions: A set containing the lower case file
+            extensions of file types to check for certificate content
+            **(optional)**.
+        :kwarg re.Pattern ignore: A compiled pattern matching paths that should
+            be ignored **(optional)**.
+        :kwarg bool inotify: Watch the paths with inotify and refresh when
+            they change, if inotify is available **(optional)**.
         """
-        self.stop = False
+        self._stop_event = threading.Event()
+        # Set when the thread is stopped or when watched paths change.
+        self._wake_event = threading.Event()
+        self._inotify = None
+        self._watcher = None
         self.models = kwargs.pop('models', None)
         self.cert_paths = kwargs.pop('cert_paths', None)
         self.scheduler = kwargs.pop('scheduler', None)
         self.refresh_interval = kwargs.pop('refresh_interval', None)
         self.file_extensions = kwargs.pop('file_extensions', None)
         self.last_refresh = None
-        self.ignore = kwargs.pop('ignore', []) or []
+        self.ignore = kwargs.pop('ignore', None)
         self.recursive = kwargs.pop('recursive', False)
+        self.use_inotify = kwargs.pop('inotify', False)
 
         assert self.models is not None, \
             "You need to pass a dict to hold the certificate model cache."
@@ -87,6 +112,34 @@ class CertFinderThread(threading.Thread):
 
         super(CertFinderThread, self).__init__(*args, **kwargs)
 
+    @property
+    def cert_paths(self):
+        """The paths to index, they can be replaced while the thread runs."""
+        return self._cert_paths
+
+    @cert_paths.setter
+    def cert_paths(self, paths):
+        """Keep the paths in order and as a set for fast membership tests."""
+        if paths is None:
+            self._cert_paths = self._cert_path_set = None
+        else:
+            self._cert_paths = tuple(paths)
+            self._cert_path_set = frozenset(self._cert_paths)
+
+    @property
+    def stop(self):
+        """Whether the thread should stop, set to True to stop it."""
+        return self._stop_event.is_set()
+
+    @stop.setter
+    def stop(self, value):
+        """Setting this to True wakes the thread if it waits for a refresh."""
+        if value:
+            self._stop_event.set()
+            self._wake_event.set()
+        else:
+            self._stop_event.clear()
+
     def run(self):
         """
         Start the certificate finder thread.
@@ -95,6 +148,16 @@ class CertFinderThread(threading.Thread):
         It will sleep instead, only because it is simpler.
         """
         LOG.info("Scanning paths: '%s'", "', '".join(self.cert_paths))
+        if self.use_inotify and self.refresh_interval is not None:
+            self._start_watching()
+        try:
+            self._run()
+        finally:
+            self._stop_watching()
+        LOG.debug("Goodbye cruel world..")
+
+    def _run(self):
+        """Refresh until the thread is stopped."""
         while not self.stop:
             # Catch any exceptions within this context to protect the thread.
             with stapled_except_handle():
@@ -116,7 +179,7 @@ class CertFinderThread(threading.Thread):
                     )
                 else:
                     # Wait the remaining time before refreshing again..
-                    LOG.info(
+                    LOG.debug(
                         "Scheduling a new refresh in %0.2f seconds because "
                         "the last refresh took %0.2f seconds while the "
                         "minimum interval is %d seconds.",
@@ -124,13 +187,104 @@ class CertFinderThread(threading.Thread):
                         since_last,
                         self.refresh_interval
                     )
-                    sleep_time = self.refresh_interval - since_last
-                    while sleep_time > 0:
-                        if self.stop:
-                            break
-                        time.sleep(1)
-                        sleep_time = sleep_time - 1
-        LOG.debug("Goodbye cruel world..")
+                    self._wait(self.refresh_interval - since_last)
+
+    def _wait(self, timeout):
+        """
+        Wait until the next refresh.
+
+        Returns early when the thread is stopped or when watched paths changed.
+
+        :param float timeout: Maximum time to wait in seconds.
+        """
+        if self._wake_event.wait(timeout) and not self.stop:
+            LOG.info(
+                "Certificate paths changed, refreshing in %d second(s).",
+                CHANGE_DELAY
+            )
+            self._stop_event.wait(CHANGE_DELAY)
+        self._wake_event.clear()
+
+    def _start_watching(self):
+        """Start a thread that wakes this thread when watched paths change."""
+        try:
+            self._inotify = inotify.INotify()
+        except OSError as exc:
+            LOG.warning(
+                "Can't watch paths for changes, refreshing every %d seconds "
+                "only: %s", self.refresh_interval, exc
+            )
+            return
+        self._watcher = threading.Thread(
+            target=self._watch_changes,
+            args=(self._inotify,),
+            name="{}-inotify".format(self.name)
+        )
+        # It is stopped by _stop_watching, but should never keep the process
+        # alive if this thread dies without stopping it.
+        self._watcher.daemon = True
+        self._watcher.start()
+
+    def _stop_watching(self):
+        """Stop the thread started by :meth:`_start_watching`, if any."""
+        if self._inotify is None:
+            return
+        self._inotify.interrupt()
+        self._watcher.join()
+        self._inotify.close()
+        self._inotify = self._watcher = None
+
+    def _watch_changes(self, notifier):
+        """
+        Wake this thread when a certificate or directory changes.
+
+        Runs in its own thread until the inotify instance is interrupted.
+
+        :param stapled.util.inotify.INotify notifier: Instance to read from.
+        """
+        while True:
+            try:
+                events = notifier.read()
+            except OSError as exc:
+                LOG.warning("Stopped watching paths for changes: %s", exc)
+                break
+            if notifier.interrupted:
+                break
+            if any(self._is_relevant(event) for event in events):
+                self._wake_event.set()
+
+    def _is_relevant(self, event):
+        """
+        Check if an inotify event could change which certificates we have.
+
+        Events for other files, such as the OCSP staples we write ourselves,
+        are not.
+
+        :param stapled.util.inotify.Event event: The event to check.
+        :return bool: True if a refresh is needed.
+        """
+        if event.mask & (inotify.IN_Q_OVERFLOW | inotify.IN_ISDIR):
+            return True
+        if not event.name:
+            # Event on a watched path itself.
+            return not event.mask & inotify.IN_IGNORED
+        return os.path.splitext(event.name)[1][1:].lower() in \
+            self.file_extensions
+
+    def _watch(self, path):
+        """
+        Watch a path for changes if inotify is used.
+
+        Watching a path that is already watched has no effect.
+
+        :param str path: File or directory to watch.
+        """
+        if self._inotify is None:
+            return
+        try:
+            self._inotify.add_watch(path, WATCH_MASK)
+        except OSError as exc:
+            LOG.warning("Can't watch path: %s for changes: %s", path, exc)
 
     def refresh(self):
         """
@@ -143,68 +297,114 @@ class CertFinderThread(threading.Thread):
             :meth:`CertFinder.run()`
         """
         self.last_refresh = time.time()
-        LOG.info("Starting a refresh run.")
+        LOG.debug("Starting a refresh run.")
         self._update_cached_certs()
         self._find_new_certs(self.cert_paths)
 
-    def _find_new_certs(self, paths, force_cert_path=None):
+    def _find_new_certs(self, paths):
         """
         Locate new files, schedule them for parsing.
 
+        With :attr:`recursive` set, sub-directories are scanned too. This is
+        done with a stack of directories rather than with recursion, so deep
+        directory trees can't exceed the recursion limit.
+
         :param list|tuple paths: Paths to scan for certificates.
-        :param str|Nonetype force_cert_path: Parent path as specified in the
-            CLI arguments. Necessary to link certificates found in `paths` to
-            any configured sockets.
-        :raises stapled.core.exceptions.CertFileAccessError: When the
-            certificate file can't be accessed.
         """
-        for path in paths:
-            if force_cert_path:
-                # Keep this value so we know in which directory it was found.
-                # Only keep the highest level, equal to what was supplied as
-                # an argument or in config.
-                cert_path = force_cert_path
-            else:
-                cert_path = path
-
+        # Local names for what is looked up for every directory entry.
+        splitext = os.path.splitext
+        file_extensions = self.file_extensions
+        models = self.models
+        # Without ignore patterns there is nothing to check for every file.
+        check_ignore = self.check_ignore if self.ignore is not None else None
+        # Directories that were already scanned, by device and inode number,
+        # so symlinks that point back up the tree don't make us loop forever.
+        seen_dirs = set()
+        # Configured paths by device and inode number. They are scanned on
+        # their own, so their certificates are linked to their sockets, also
+        # when they are reached through a symlink inside another path.
+        cert_path_ids = set()
+        # Directories to scan with the configured path they were found in.
+        # Certificates are linked to the highest level path, equal to what was
+        # supplied as an argument or in config, so they are linked to its
+        # sockets.
+        stack = [(path, path) for path in reversed(list(paths))]
+        if self.recursive:
+            for path in paths:
+                try:
+                    stat = os.stat(path)
+                    cert_path_ids.add((stat.st_dev, stat.st_ino))
+                except OSError:
+                    # Reported when the path is scanned.
+                    pass
+        while stack:
+            path, cert_path = stack.pop()
             try:
                 LOG.debug("Scanning path: %s", path)
-                dirs = []
+                files = []
+                sub_dirs = []
                 try:
-                    dirs = os.listdir(path)
+                    # DirEntry objects cache the file type from the directory
+                    # listing so we don't need an extra stat call per entry.
+                    # The iterator closes itself when it is exhausted.
+                    for entry in os.scandir(path):
+                        if entry.is_dir():
+                            sub_dirs.append(entry)
+                        elif splitext(entry.name)[1][1:].lower() in \
+                                file_extensions:
+                            files.append((entry.path, entry))
+                    self._watch(path)
                 except (OSError) as exc:
                     # If a path is actually a file we can still use it..
                     if exc.errno == errno.ENOTDIR and os.path.isfile(path):
                         LOG.debug("%s may be a single file", path)
                         # This will allow us to use our usual iteration.
-                        dirs = [os.path.basename(path)]
-                        path = os.path.dirname(path)
+                        if splitext(path)[1][1:].lower() in file_extensions:
+                            files = [(path, None)]
+                        self._watch(path)
                     else:
                         raise exc
-                for entry in dirs:
-                    entry = os.path.join(path, entry)
-                    if os.path.isdir(entry):
-                        if self.recursive:
-                            LOG.debug("Recursing path %s", entry)
-                            self._find_new_certs([entry], cert_path)
+                if self.recursive:
+                    for entry in reversed(sub_dirs):
+                        try:
+                            stat = entry.stat()
+                        except OSError as exc:
+                            LOG.critical(
+                                "Can't read path: %s, reason: %s.",
+                                entry.path, exc
+                            )
+                            continue
+                        dir_id = (stat.st_dev, stat.st_ino)
+                        if dir_id in cert_path_ids:
+                            LOG.debug("Skipping cert path %s", entry.path)
+                            continue
+                        if dir_id in seen_dirs:
+                            LOG.debug("Already scanned path %s", entry.path)
+                            continue
+                        seen_dirs.add(dir_id)
+                        LOG.debug("Recursing path %s", entry.path)
+                        stack.append((entry.path, cert_path))
+                for filename, entry in files:
+                    if filename in models:
                         continue
-                    ext = os.path.splitext(entry)[1].lstrip(".")
-                    if ext not in self.file_extensions:
-                        continue
-                    if entry in self.models:
-                        continue
-                    if self.check_ignore(entry):
+                    if check_ignore is not None and check_ignore(filename):
                         LOG.debug(
                             "Ignoring file %s, because it's on the ignore "
                             "list.",
-                            entry
+                            filename
                         )
                         continue
-                    model = CertModel(entry, cert_path=cert_path)
+                    # Reuse the stat result of the directory entry if we have
+                    # one, the model would stat the file otherwise.
+                    modtime = entry.stat().st_mtime_ns if entry else None
+                    model = CertModel(
+                        filename, cert_path=cert_path, modtime=modtime
+                    )
                     # Remember the model so we can compare the file later to
                     # see if it changed.
-                    self.models[entry] = model
-                    # Schedule the certificate for parsing.
+                    models[filename] = model
+                    # Schedule the certificate for parsing right away, so it
+                    # is parsed while the rest of the paths are scanned.
                     context = StapleTaskContext(
                         task_name="parse",
                         model=model,
@@ -244,20 +444,32 @@ class CertFinderThread(threading.Thread):
         If a file was modified since it was last seen, the file is added to the
         scheduler to get the new certificate data parsed.
 
-        Deleted files are removed from the model cache in
+        Deleted files and files in certificate paths that are no longer
+        configured are removed from the model cache in
         :attr:`stapled.core.daemon.run.models`. Any scheduled tasks for the
         model's task context are cancelled.
-
-        :raises stapled.core.exceptions.CertFileAccessError: When the
-            certificate file can't be accessed.
         """
         deleted = []
         changed = []
         for filename, model in self.models.items():
-            if not os.path.exists(filename):
+            if model.cert_path not in self._cert_path_set:
+                LOG.info(
+                    "Path %s is no longer configured, removing %s from the "
+                    "cache.", model.cert_path, filename)
                 deleted.append(filename)
-            elif os.path.getmtime(filename) > model.modtime:
-                changed.append(filename)
+                continue
+            # A single stat tells us whether the file exists and whether it
+            # changed.
+            try:
+                modtime = os.stat(filename).st_mtime_ns
+            except OSError:
+                LOG.info(
+                    "File %s was deleted, removing it from the cache.",
+                    filename)
+                deleted.append(filename)
+                continue
+            if modtime > model.modtime:
+                changed.append((filename, modtime))
 
         # Purge certs that no longer exist in the cert dirs
         for filename in deleted:
@@ -265,15 +477,13 @@ class CertFinderThread(threading.Thread):
             self.scheduler.cancel_by_subject(self.models[filename])
             # Remove the model from cache
             self._del_model(filename)
-            LOG.info(
-                "File %s was deleted, removing it from the cache.", filename)
 
         # Re-add files that have changed, we will make a new model so the model
         # is an accurate representation of what is in the cerificate file on
         # disk, this is just to prevent any stale data being used in the
         # process. Making the new model and scheduling a parse will make go
         # through all the steps to get the certificate stapled ASAP again.
-        for filename in changed:
+        for filename, modtime in changed:
             # Cancel any scheduled tasks for the model.
             self.scheduler.cancel_by_subject(self.models[filename])
             # Before deleting the model from cache take relevant information
@@ -283,27 +493,20 @@ class CertFinderThread(threading.Thread):
             self._del_model(filename)
             # Make a new model.
             LOG.info("File %s changed, parsing it again.", filename)
-            new_model = CertModel(filename, cert_path)
+            new_model = CertModel(filename, cert_path, modtime=modtime)
             context = StapleTaskContext(
                 task_name="parse", model=new_model, sched_time=None)
             self.scheduler.add_task(context)
 
-    @cache(10000)
     def check_ignore(self, path):
         """
-        Check if a file path matches any pattern in the ignore list.
+        Check if a file path matches the ignore pattern.
 
-        :param str path: Path to match a pattern in ``self.ignore``.
+        The pattern is compiled once from all ignore globs, matching it is
+        cheaper than a cache lookup so results are not cached.
+
+        :param str path: Path to match against ``self.ignore``.
         """
-        for pattern in self.ignore:
-            # Strip spaces, check if length still greater than 0
-            pattern = pattern.strip()
-            if not pattern:
-                continue
-            # If pattern starts with / it is absolute, do nothing, if not, add
-            # ``**`` to make fnmatch match any parent directory.
-            if pattern[0] != '/':
-                pattern = "**{}".format(pattern)
-            if fnmatch.fnmatch(path, pattern):
-                return True
-        return False
+        if self.ignore is None:
+            return False
+        return self.ignore.match(path) is not None
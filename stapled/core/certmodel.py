@@ -29,6 +29,7 @@ from stapled.core.exceptions import CertParsingError
 from stapled.core.exceptions import CertValidationError
 from stapled.util.ocsp import OCSPResponseParser
 from stapled.util.functions import pretty_base64
+from stapled.util.pem import unarmor
 
 LOG = logging.getLogger(__name__)
 
@@ -37,17 +38,32 @@ class CertModel(object):
     """
     Model for certificate files.
     """
+    # There is a model for every certificate file, slots keep them small.
+    __slots__ = (
+        'filename', 'ocsp_filename', 'modtime', 'end_entity', 'intermediates',
+        'ocsp_staple', 'ocsp_urls', 'chain', 'url_index', 'crt_data',
+        'cert_path'
+    )
     # pylint: disable=too-many-instance-attributes
-    def __init__(self, filename, cert_path):
+    def __init__(self, filename, cert_path, modtime=None):
         """
-        Initialise the CertModel model object, and read the certificate data
-        from the passed filename.
+        Initialise the CertModel model object.
 
-        :raises stapled.core.exceptions.CertFileAccessError: When the certificate
-            file can't be accessed.
+        The certificate data is read from the passed filename when it is
+        parsed, so the certificate finder doesn't have to wait for it.
+
+        :param str filename: Path to the certificate file.
+        :param str cert_path: The certificate path the file was found in.
+        :param int|NoneType modtime: Modification time of the file in
+            nanoseconds if it is already known, otherwise the file's
+            modification time is read.
         """
         self.filename = filename
-        self.modtime = os.path.getmtime(filename)
+        # HAProxy expects the staple next to the certificate file.
+        self.ocsp_filename = "{}.ocsp".format(filename)
+        if modtime is None:
+            modtime = os.stat(filename).st_mtime_ns
+        self.modtime = modtime
         self.end_entity = None
         self.intermediates = []
         self.ocsp_staple = None
@@ -56,22 +72,26 @@ class CertModel(object):
         self.url_index = 0
         self.crt_data = None
         self.cert_path = cert_path
-        try:
-            with open(filename, 'rb') as f_obj:
-                self.crt_data = f_obj.read()
-        except (IOError, OSError) as exc:
-            raise CertFileAccessError(
-                "Can't access file %s, reason: %s", filename, exc)
 
     def parse_crt_file(self):
         """
         Parse certificate, wraps the
+        :meth:`~stapled.core.certmodel.CertModel._read_crt_file()`,
         :meth:`~stapled.core.certmodel.CertModel._read_full_chain()` and the
         :meth:`~stapled.core.certmodel.CertModel._validate_cert()` methods.
         Wicth extract the certificate (*end_entity*) and the chain
         intermediates*), and validates the certificate chain.
+
+        :raises stapled.core.exceptions.CertFileAccessError: When the
+            certificate file can't be accessed.
         """
-        self._read_full_chain()
+        self._read_crt_file()
+        try:
+            self._read_full_chain()
+        finally:
+            # The raw file contents are not needed anymore once the chain is
+            # parsed, don't keep them around for the lifetime of the model.
+            self.crt_data = None
         self.chain = self._validate_cert()
 
     def recycle_staple(self, minimum_validity):
@@ -87,18 +107,17 @@ class CertModel(object):
         :return bool: False if a new staple should be requested, True if the
             current one is still valid for more than ``minimum_validity``
         """
-        ocsp_file = "{}.ocsp".format(self.filename)
-        if not os.path.exists(ocsp_file):
+        ocsp_file = self.ocsp_filename
+        try:
+            LOG.debug("Seeing if %s is still valid..", ocsp_file)
+            with open(ocsp_file, "rb") as file_handle:
+                raw_staple = file_handle.read()
+        except FileNotFoundError:
             LOG.debug(
                 "File does not exist yet: %s, need to request a staple.",
                 ocsp_file
             )
             return False
-
-        try:
-            LOG.debug("Seeing if %s is still valid..", ocsp_file)
-            with open(ocsp_file, "rb") as file_handle:
-                raw_staple = file_handle.read()
         except (IOError, OSError):
             # Can't access the staple file, game over.
             LOG.error("Can't access %s, let's schedule a renewal.", ocsp_file)
@@ -123,7 +142,7 @@ class CertModel(object):
             LOG.info(
                 "Staple %s expires %s, we can still use it.",
                 ocsp_file,
-                staple.valid_until.strftime('%Y-%m-%d %H:%M:%S')
+                until.strftime('%Y-%m-%d %H:%M:%S')
             )
         except CertValidationError:
             # Staple can't be validated, this is ok, we will just
@@ -207,10 +226,22 @@ class CertModel(object):
         self._validate_cert(self.ocsp_staple.raw)
         # No exception was raised, so we can assume the staple is ok and write
         # it to disk.
-        ocsp_filename = "{}.ocsp".format(self.filename)
-        LOG.info("Succesfully validated writing to file \"%s\"", ocsp_filename)
-        with open(ocsp_filename, 'wb') as f_obj:
-            f_obj.write(self.ocsp_staple.raw.dump())
+        LOG.info(
+            "Succesfully validated writing to file \"%s\"", self.ocsp_filename
+        )
+        # Write to a temporary file first and move it in place, so HAProxy
+        # never reads a partially written staple.
+        tmp_filename = "{}.tmp".format(self.ocsp_filename)
+        try:
+            with open(tmp_filename, 'wb') as f_obj:
+                f_obj.write(self.ocsp_staple.raw.dump())
+            os.replace(tmp_filename, self.ocsp_filename)
+        except OSError:
+            try:
+                os.remove(tmp_filename)
+            except OSError:
+                pass
+            raise
         return True
 
     def _check_ocsp_response(self, ocsp_staple, url):
@@ -243,24 +274,70 @@ class CertModel(object):
                 parsed_staple.valid_until.strftime('%Y-%m-%d %H:%M:%S')
             )
             return parsed_staple
-        elif status == 'revoked':
+        if status == 'revoked':
             raise OCSPBadResponse(
                 "Certificate {} was revoked!".format(self.filename)
             )
-        else:
-            raise OCSPBadResponse(
-                "Can't get status for {} from {}",
+        raise OCSPBadResponse(
+            "Can't get status for {} from {}, status: {}".format(
                 self.filename,
-                url
+                url,
+                status
+            )
+        )
+
+    def _read_crt_file(self):
+        """
+        Read the certificate file into :attr:`self.crt_data`.
+
+        :raises stapled.core.exceptions.CertFileAccessError: When the
+            certificate file can't be accessed.
+        """
+        try:
+            # Certificate files are small, read them in one go without the
+            # buffering and the extra reads of a file object.
+            fd = os.open(self.filename, os.O_RDONLY)
+            try:
+                self.crt_data = os.read(fd, os.fstat(fd).st_size)
+            finally:
+                os.close(fd)
+        except (IOError, OSError) as exc:
+            raise CertFileAccessError(
+                "Can't access file {}, reason: {}".format(self.filename, exc)
             )
-        return None
+
+    def _load_certificates(self):
+        """
+        Load the certificates in :attr:`self.crt_data`.
+
+        The file can contain PEM encoded certificates or one or more DER
+        encoded certificates. PEM files may start with any text, so data is
+        only loaded as DER if it doesn't contain the start of a PEM block.
+
+        :return generator: :class:`asn1crypto.x509.Certificate` objects.
+        :raises ValueError: If the data can't be parsed.
+        :raises binascii.Error: If a PEM block contains invalid base64 data.
+        """
+        data = self.crt_data
+        if b'-----BEGIN' not in data:
+            offset = 0
+            while offset < len(data):
+                # Trailing data is ignored by a non-strict load, the length of
+                # the dumped certificate tells where the next one starts.
+                crt = asn1crypto.x509.Certificate.load(data[offset:])
+                offset += len(crt.dump())
+                yield crt
+        else:
+            for type_name, _, der_bytes in unarmor(data):
+                if type_name == 'CERTIFICATE':
+                    yield asn1crypto.x509.Certificate.load(der_bytes)
 
     def _read_full_chain(self):
         """
-        Parses binary data in :attr:`self.crt_data` and parses the content.
-        The server certificate a.k.a. *end_entity* is put in
-        :attr:`self.end_entity`, anything else that has a CA extension is added
-        to :attr:`self.intermediates`.
+        Parses binary data in :attr:`self.crt_data` and parses the content,
+        which can be PEM or DER encoded. The server certificate a.k.a.
+        *end_entity* is put in :attr:`self.end_entity`, anything else that has
+        a CA extension is added to :attr:`self.intermediates`.
 
         .. Note:: At this point it is not clear yet which of the intermediates
             is the root and which are actual intermediates.
@@ -269,17 +346,14 @@ class CertModel(object):
             contains errors or parts of the chain are missing.
         """
         try:
-            pem_obj = asn1crypto.pem.unarmor(self.crt_data, multiple=True)
-            for type_name, _, der_bytes in pem_obj:
-                if type_name == 'CERTIFICATE':
-                    crt = asn1crypto.x509.Certificate.load(der_bytes)
-                    if getattr(crt, 'ca'):
-                        LOG.debug("Found part of the chain..")
-                        self.intermediates.append(crt)
-                    else:
-                        LOG.debug("Found the end entity..")
-                        self.end_entity = crt
-                        self.ocsp_urls = getattr(crt, 'ocsp_urls')
+            for crt in self._load_certificates():
+                if crt.ca:
+                    LOG.debug("Found part of the chain..")
+                    self.intermediates.append(crt)
+                else:
+                    LOG.debug("Found the end entity..")
+                    self.end_entity = crt
+                    self.ocsp_urls = crt.ocsp_urls
         except (binascii.Error, ValueError):
             raise CertParsingError(
                 "Certificate file contains errors \"{}\".".format(
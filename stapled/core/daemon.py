@@ -48,10 +48,10 @@ This module bootstraps the stapled process by starting threads for:
 
 """
 import logging
+import os
+import select
 import time
-import threading
 import signal
-import re
 from stapled.core.certfinder import CertFinderThread
 from stapled.core.certparser import CertParserThread
 from stapled.core.staplerenewer import StapleRenewerThread
@@ -71,66 +71,68 @@ class Stapledaemon(object):
         the entire process is halted or all threads are killed.
 
         :param **dict kwargs: Parsed CLI arguments and configurations.
-        :kwarg list cert_paths: A list of certificate paths to scan for
-            certificates.
+        :kwarg tuple cert_paths: Certificate paths to scan for certificates.
         :kwarg dict|NoneType haproxy_socket_mapping: A mapping of certificate
             directories and corresponding HAProxy sockets or None.
-        :kwarg list file_extensions: List of file extensions to search for
-            certificates.
+        :kwarg frozenset file_extensions: Set of lower case file extensions to
+            search for certificates.
         :kwarg int renewal_threads: Amount of staple renewal threads.
         :kwarg NoneType|int refresh_interval: Interval between re-indexing of
             certificate paths.
         :kwarg int minimum_validity: Minimum validity of stapled before
             renewing.
         :kwarg bool recursive: Recursively scan certificate directories.
-        :kwarg list ignore: List of paths to ignore during indexing of
-            certificate directories.
+        :kwarg bool inotify: Refresh as soon as certificate paths change.
+        :kwarg re.Pattern|NoneType ignore: Compiled pattern of paths to ignore
+            during indexing of certificate directories.
+        :kwarg callable|NoneType reload_callback: Called without arguments on
+            ``SIGHUP``, should return a dict with new ``cert_paths`` and
+            ``haproxy_socket_mapping`` values, see :meth:`reload`.
         """
-        LOG.debug("Started with CLI args: %s", str(kwargs))
+        LOG.debug("Started with CLI args: %s", kwargs)
         self.cert_paths = kwargs.pop('cert_paths', None)
         self.haproxy_socket_mapping = kwargs.pop(
             'haproxy_socket_mapping', None
         )
         self.haproxy_socket_keepalive = kwargs.pop('haproxy_socket_keepalive')
         self.file_extensions = kwargs.pop('file_extensions')
-        self.file_extensions = self.file_extensions.replace(" ", "").split(",")
         self.renewal_threads = kwargs.pop('renewal_threads')
         self.refresh_interval = kwargs.pop('refresh_interval')
         self.one_off = kwargs.pop('one_off')
         self.minimum_validity = kwargs.pop('minimum_validity')
         self.recursive = kwargs.pop('recursive')
+        self.inotify = kwargs.pop('inotify', False)
         self.no_recycle = kwargs.pop('no_recycle')
         self.exit_code_tracker = kwargs.pop('exit_code_tracker')
 
-        self.ignore = []
-        rel_path_re = re.compile(r'^\.+\/')
-        ignore = kwargs.pop('ignore', None)
-        if ignore is not None:
-            # Filter out patterns that look like relative paths, e.g.:
-            # ./cert.pem and ../certs/*.crt, i.e. starts with one or more
-            # ``.`` followed by ``/``.
-            for pattern in ignore:
-                if rel_path_re.match(pattern) is not None:
-                    LOG.warn(
-                        "Pattern %s seems to be a relative path, rather than a"
-                        "pattern, ignoring this pattern.",
-                        pattern
-                    )
-                else:
-                    self.ignore.append(pattern)
+        self.ignore = kwargs.pop('ignore', None)
+        self.reload_callback = kwargs.pop('reload_callback', None)
 
         self.model_cache = {}
         self.all_threads = []
         self.stop = False
+        self.reload_requested = False
+        # Threads that returned from their run method, see __spawn_thread.
+        self.finished_threads = []
+        # Self-pipe that wakes up monitor_threads when a thread finishes or a
+        # signal arrives. Python writes to the wakeup fd itself when a signal
+        # is received, so signal handlers only need to set flags.
+        self.wakeup_read, self.wakeup_write = os.pipe()
+        os.set_blocking(self.wakeup_read, False)
+        os.set_blocking(self.wakeup_write, False)
+        signal.set_wakeup_fd(self.wakeup_write)
 
         # Listen to SIGINT and SIGTERM
         signal.signal(signal.SIGINT, self.exit_gracefully)
         signal.signal(signal.SIGTERM, self.exit_gracefully)
+        # Listen to SIGHUP if we know how to get a new configuration
+        if self.reload_callback is not None:
+            signal.signal(signal.SIGHUP, self.reload_gracefully)
 
         LOG.info(
             "Starting OCSP Stapling daemon, finding files of types: %s with "
             "%d threads.",
-            ", ".join(self.file_extensions),
+            ", ".join(sorted(self.file_extensions)),
             self.renewal_threads
         )
 
@@ -161,6 +163,51 @@ class Stapledaemon(object):
         LOG.info("Exiting with signal number %d", signum)
         self.stop = True
 
+    def reload_gracefully(self, signum, _frame):
+        """Set self.reload_requested so the main thread reloads."""
+        LOG.info("Reloading with signal number %d", signum)
+        self.reload_requested = True
+
+    def reload(self):
+        """
+        Apply a new configuration without restarting the daemon.
+
+        Only the certificate paths and the HAProxy socket mapping are
+        reloaded, the model cache (and with it all OCSP staples that were
+        already fetched) and the open HAProxy sockets are kept. Certificates in
+        paths that are no longer configured are removed from the cache by the
+        finder on its next refresh, certificates in new paths are found on
+        that refresh too. Other settings require a restart.
+        """
+        try:
+            new_config = self.reload_callback()
+        except Exception as exc:  # pylint: disable=broad-except
+            LOG.error(
+                "Not reloading, keeping the current configuration: %s", exc
+            )
+            return
+        old_paths = set(self.cert_paths)
+        self.cert_paths = new_config['cert_paths']
+        self.haproxy_socket_mapping = new_config['haproxy_socket_mapping']
+        LOG.info(
+            "Reloaded configuration, added paths: '%s', removed paths: '%s'",
+            "', '".join(sorted(set(self.cert_paths) - old_paths)),
+            "', '".join(sorted(old_paths - set(self.cert_paths)))
+        )
+
+        for thread in self.all_threads:
+            if thread['object'] is CertFinderThread:
+                thread['kwargs']['cert_paths'] = self.cert_paths
+                thread['thread'].cert_paths = self.cert_paths
+            elif thread['object'] is StapleAdder:
+                # Without sockets, the adder has nothing left to send to. New
+                # sockets are opened when a staple is first sent to them.
+                mapping = self.haproxy_socket_mapping or {}
+                thread['kwargs']['haproxy_socket_mapping'] = mapping
+                thread['thread'].haproxy_socket_mapping = mapping
+        if self.haproxy_socket_mapping and self.staple_adder is None:
+            self.staple_adder = self.start_staple_adder_thread()
+
     def start_scheduler_thread(self):
         """Spawn a scheduler thread with the appropriate keyword arguments."""
         return self.__spawn_thread(
@@ -190,7 +237,8 @@ class Stapledaemon(object):
             file_extensions=self.file_extensions,
             scheduler=self.scheduler,
             ignore=self.ignore,
-            recursive=self.recursive
+            recursive=self.recursive,
+            inotify=self.inotify
         )
 
     def start_renewer_thread(self, tid):
@@ -218,18 +266,34 @@ class Stapledaemon(object):
         Monitor and manage threads.
 
         Check if any threads have died, respawn them until the
-        MAX_RESTART_THREADS limit is reached. Wait for a KeyBoardInterrupt,
-        when it comes, tell all threads to stop and wait for them to stop.
+        MAX_RESTART_THREADS limit is reached. Reload the configuration when
+        asked to with ``SIGHUP``. Wait for a KeyBoardInterrupt, when it comes,
+        tell all threads to stop and wait for them to stop.
+
+        Nothing is polled, this only wakes up when a thread finishes or a
+        signal is received, see :meth:`wait_for_wakeup`.
         """
         while not self.stop:
-            restart = []
+            if self.reload_requested:
+                self.reload_requested = False
+                self.reload()
+            # A finished thread wakes us up just before it actually ends,
+            # make sure it is no longer alive before looking for dead threads.
+            while self.finished_threads:
+                self.finished_threads.pop().join()
             # Find crashed threads
-            for key, thread in enumerate(self.all_threads):
-                if not thread['thread'].is_alive():
-                    restart.append(key)
+            restart = [
+                thread for thread in self.all_threads
+                if not thread['thread'].is_alive()
+            ]
+            if restart:
+                restart_ids = set(id(thread) for thread in restart)
+                self.all_threads = [
+                    thread for thread in self.all_threads
+                    if id(thread) not in restart_ids
+                ]
             # Respawn crashed threads
-            for key in restart:
-                thread = self.all_threads.pop(key)
+            for thread in restart:
                 if thread['restarted'] < MAX_RESTART_THREADS:
                     LOG.error(
                         "Thread: %s, type: %s was found dead, spawning a "
@@ -251,20 +315,35 @@ class Stapledaemon(object):
                         thread['object'],
                         thread['restarted']
                     )
-            time.sleep(0.25)
+            self.wait_for_wakeup()
 
         # This code is executed when self.stop is True
         LOG.info("Stopping all threads..")
         for thread in self.all_threads:
             thread['thread'].stop = True
-        for thread in threading.enumerate():
-            LOG.info("Waiting for thread %s to stop..", thread.name)
-            try:
-                thread.join()
-            except RuntimeError:
-                pass  # cannot join current thread
+        # Only join our own threads, others such as the log queue listener
+        # are stopped by their owners when the process exits.
+        for thread in self.all_threads:
+            LOG.info("Waiting for thread %s to stop..", thread['name'])
+            thread['thread'].join()
         LOG.info("Stopping daemon thread")
 
+    def wait_for_wakeup(self):
+        """
+        Wait until a thread finishes or a signal is received.
+
+        Both write to :attr:`wakeup_write`, everything written is discarded
+        since the flags and :attr:`finished_threads` tell what happened.
+        """
+        if self.stop or self.reload_requested or self.finished_threads:
+            return
+        select.select([self.wakeup_read], [], [])
+        try:
+            while os.read(self.wakeup_read, 1024):
+                pass
+        except BlockingIOError:
+            pass
+
     def handle_one_off(self):
         """
         Stop threads that are done so we can do a one-off run.
@@ -338,6 +417,20 @@ class Stapledaemon(object):
         :param str name: Name of the thread
         """
         thread_obj = thread_object(**kwargs)
+        thread_run = thread_obj.run
+
+        def run():
+            """Run the thread, wake up the monitor when it finishes."""
+            try:
+                thread_run()
+            finally:
+                self.finished_threads.append(thread_obj)
+                try:
+                    os.write(self.wakeup_write, b'\0')
+                except BlockingIOError:
+                    pass  # Pipe is full, the monitor will wake up anyway.
+
+        thread_obj.run = run
         thread_obj.daemon = False
         thread_obj.name = name
         thread_obj.start()
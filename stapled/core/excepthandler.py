@@ -160,7 +160,7 @@ def delete_ocsp_for_context(ctx):
     """
     LOG.info("Zero-ing any OCSP staple: \"%s.ocsp\" if it exists.", ctx.model)
     try:
-        ocsp_file = "{}.ocsp".format(ctx.model.filename)
+        ocsp_file = ctx.model.ocsp_filename
         with open(ocsp_file, 'w') as ocsp_file_obj:
             ocsp_file_obj.write("")
     except (OSError) as exc:
@@ -40,15 +40,16 @@ class CertFileAccessError(Exception):
 class CertParsingError(Exception):
     """Raised when something went wrong while parsing the certificate file."""
 
-    def __init__(self, msg, *args, **kwargs):
+    def __init__(self, msg, log_level=CRITICAL):
         """
         Add a critical flag to init.
 
         :param str msg: Exception message.
-        :kwarg log_level: Python logging log level, default: logging.CRITICAL
+        :param int log_level: Python logging log level, default:
+            logging.CRITICAL
         """
-        self.log_level = kwargs.pop('log_level', CRITICAL)
-        super(CertParsingError, self).__init__(msg, *args, **kwargs)
+        self.log_level = log_level
+        super(CertParsingError, self).__init__(msg)
 
 
 class CertValidationError(Exception):
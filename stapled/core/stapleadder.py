@@ -6,13 +6,30 @@ import logging
 import socket
 import errno
 import queue
-from io import StringIO
+import re
+import select
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from stapled.core.excepthandler import stapled_except_handle
 import stapled.core.exceptions
 
 LOG = logging.getLogger(__name__)
 SOCKET_BUFFER_SIZE = 1024
 
+#: Maximum amount of threads used to talk to HAProxy sockets at the same time.
+MAX_SOCKET_WORKERS = 8
+
+#: Maximum amount of staples that are sent to a HAProxy socket in one go.
+MAX_BATCH_SIZE = 32
+
+#: Seconds to wait for HAProxy to respond before giving up on a socket.
+SOCKET_TIMEOUT = 10
+
+#: HAProxy ends every response with a prompt after the ``prompt`` command. A
+#: prompt is at the start of a line, or directly follows the prompt of an
+#: empty response.
+PROMPT = re.compile(br'(?:^|(?<=\n)|(?<=> ))> ')
+
 
 class StapleAdder(threading.Thread):
     """
@@ -51,9 +68,9 @@ class StapleAdder(threading.Thread):
         :kwarg stapled.scheduling.SchedulerThread scheduler: The scheduler
             object where we can get "haproxy-adder" tasks from **(required)**.
         """
-        self.stop = False
-        LOG.debug("Starting StapleAdder thread")
         self.scheduler = kwargs.pop('scheduler', None)
+        self._stop_requested = False
+        LOG.debug("Starting StapleAdder thread")
         self.haproxy_socket_mapping = kwargs.pop(
             'haproxy_socket_mapping', None
         )
@@ -74,13 +91,44 @@ class StapleAdder(threading.Thread):
         ]
 
         self.socks = {}
-        for paths in self.haproxy_socket_mapping.values():
-            for path in paths:
-                with stapled_except_handle():
-                    self._open_socket(path)
+        # The base64 encoded staple that HAProxy accepted last, by socket path
+        # and certificate file name.
+        self.sent_staples = {}
+        # Several certificate paths can share a socket, open each one once.
+        paths = set(
+            path for paths in self.haproxy_socket_mapping.values()
+            for path in paths
+        )
+        # Talking to a socket waits for HAProxy, so the sockets are used in
+        # parallel by a pool that lives as long as this thread. Sockets that
+        # are added on a reload share the pool, its threads are only started
+        # when there is work for them.
+        self._executor = ThreadPoolExecutor(max_workers=MAX_SOCKET_WORKERS)
+        list(self._executor.map(self._try_open_socket, paths))
 
         super(StapleAdder, self).__init__(*args, **kwargs)
 
+    @property
+    def stop(self):
+        """Whether the thread should stop, set to True to stop it."""
+        return self._stop_requested
+
+    @stop.setter
+    def stop(self, value):
+        """Setting this to True wakes the thread if it waits for a task."""
+        self._stop_requested = value
+        if value:
+            self.scheduler.wake_consumer(self.TASK_NAME)
+
+    def _try_open_socket(self, path):
+        """
+        Open the socket located at path, errors are logged and not raised.
+
+        :param str path: A valid HAProxy socket path.
+        """
+        with stapled_except_handle():
+            self._open_socket(path)
+
     def _re_open_socket(self, path):
         """
         Re-open socket located at path, and return the socket.
@@ -95,15 +143,23 @@ class StapleAdder(threading.Thread):
         # Try to re-open the socket. If that doesn't work, that
         # will raise a :exc:`~stapled.core.exceptions.SocketError`
         LOG.info("Re-opening socket %s", path)
-        try:
-            sock = self.socks[path]
-            sock.close()
-        except (KeyError, UnboundLocalError):
-            # Socket not openend, no need to close anything.
-            pass
+        self._close_socket(path)
         # Open socket again..
         return self._open_socket(path)
 
+    def _close_socket(self, path):
+        """
+        Close the socket located at path, if it is open.
+
+        :param str path: A valid HAProxy socket path.
+        """
+        sock = self.socks.pop(path, None)
+        if sock is not None:
+            sock.close()
+        # HAProxy may have restarted, don't assume it has any staples.
+        for key in [key for key in list(self.sent_staples) if key[0] == path]:
+            self.sent_staples.pop(key, None)
+
     def _open_socket(self, path):
         """
         Open socket located at path, and return the socket.
@@ -118,6 +174,8 @@ class StapleAdder(threading.Thread):
             not be opened.
         """
         sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Don't wait forever for a HAProxy instance that hangs.
+        sock.settimeout(SOCKET_TIMEOUT)
         try:
             sock.connect(path)
             result = []
@@ -139,7 +197,8 @@ class StapleAdder(threading.Thread):
             )
 
     def __del__(self):
-        """Close the sockets on exit."""
+        """Close the sockets and stop the socket workers on exit."""
+        self._executor.shutdown(wait=False)
         for sock in self.socks.values():
             sock.close()
 
@@ -152,42 +211,108 @@ class StapleAdder(threading.Thread):
         LOG.info("Started an OCSP adder thread.")
 
         while not self.stop:
-            try:
-                context = self.scheduler.get_task(self.TASK_NAME, timeout=0.25)
-                model = context.model
-                LOG.debug("Sending staple for cert:'%s'", model)
+            contexts = self._get_contexts()
+            if contexts:
+                self.add_staples(contexts)
+            for _ in contexts:
+                self.scheduler.task_done(self.TASK_NAME)
+        self._executor.shutdown()
+        LOG.debug("Goodbye cruel world..")
+
+    def _get_contexts(self):
+        """
+        Wait for a task, then also take the tasks that are already queued.
 
-                # Open the exception handler context to run tasks likely to
-                # fail
-                with stapled_except_handle(context):
-                    self.add_staple(model)
+        :return list: Up to :const:`MAX_BATCH_SIZE` task contexts, empty if
+            the thread was woken up to check whether it should stop.
+        """
+        contexts = []
+        context = self.scheduler.get_task(self.TASK_NAME)
+        while True:
+            if context is None:
+                # Woken up to check whether we should stop.
                 self.scheduler.task_done(self.TASK_NAME)
+                break
+            contexts.append(context)
+            if len(contexts) >= MAX_BATCH_SIZE:
+                break
+            try:
+                context = self.scheduler.get_task(self.TASK_NAME, False)
             except queue.Empty:
-                pass
-        LOG.debug("Goodbye cruel world..")
+                break
+        return contexts
 
-    def add_staple(self, model):
+    def add_staples(self, contexts):
         """
-        Create and send base64 encoded OCSP staple to the HAProxy.
+        Create and send base64 encoded OCSP staples to the HAProxy.
+
+        The staples for a socket are sent in one go, errors are handled for
+        each context separately.
 
-        :param model: An object that has a binary string `ocsp_staple` in it
-            and a filename `filename`.
+        :param list contexts: Task contexts with a model that has an
+            ``ocsp_staple`` in it, a filename ``filename`` and a
+            ``cert_path``.
         """
-        command = self.OCSP_ADD.format(model.ocsp_staple.base64)
-        LOG.debug("Setting OCSP staple with command '%s'", command)
-        paths = self.haproxy_socket_mapping[model.cert_path]
-        if not paths:
-            LOG.debug("No socket set for %s", model.filename)
-            return
-        responses = self.send(paths, command)
-        for path, response in responses:
-            if response != 'OCSP Response updated!':
-                raise stapled.core.exceptions.StapleAdderBadResponse(
-                    "Bad HAProxy response: '{}' from socket {}".format(
-                        response,
-                        path
-                    )
-                )
+        commands = defaultdict(list)
+        for context in contexts:
+            model = context.model
+            LOG.debug("Sending staple for cert:'%s'", model)
+            # The mapping may have changed on a reload since the model was
+            # found.
+            paths = self.haproxy_socket_mapping.get(model.cert_path)
+            if not paths:
+                LOG.debug("No socket set for %s", model.filename)
+                continue
+            # Open the exception handler context to run tasks likely to fail
+            with stapled_except_handle(context):
+                staple = model.ocsp_staple.base64
+                command = self.OCSP_ADD.format(staple)
+                LOG.debug("Setting OCSP staple with command '%s'", command)
+                for path in paths:
+                    if self.sent_staples.get((path, model.filename)) == staple:
+                        LOG.debug(
+                            "Socket %s already has this staple for %s",
+                            path,
+                            model.filename
+                        )
+                        continue
+                    commands[path].append((context, command))
+
+        # Each socket has its own HAProxy conversation, talk to them in
+        # parallel so a slow HAProxy instance doesn't hold up the others.
+        paths = list(commands)
+        path_commands = [
+            [item[1] for item in commands[path]] for path in paths
+        ]
+        if len(paths) > 1:
+            results = list(
+                self._executor.map(self.send, paths, path_commands)
+            )
+        else:
+            results = [self.send(*args) for args in zip(paths, path_commands)]
+
+        responses = defaultdict(list)
+        for path, path_responses in zip(paths, results):
+            # Commands without a response failed, e.g. because the socket
+            # could not be used.
+            path_responses = path_responses + \
+                [''] * (len(commands[path]) - len(path_responses))
+            for (context, _), response in zip(commands[path], path_responses):
+                responses[context].append((path, response))
+
+        for context in contexts:
+            with stapled_except_handle(context):
+                model = context.model
+                for path, response in responses[context]:
+                    if response != 'OCSP Response updated!':
+                        raise stapled.core.exceptions.StapleAdderBadResponse(
+                            "Bad HAProxy response: '{}' from socket {}".format(
+                                response,
+                                path
+                            )
+                        )
+                    self.sent_staples[(path, model.filename)] = \
+                        model.ocsp_staple.base64
 
     @staticmethod
     def _send(sock, command):
@@ -206,17 +331,18 @@ class StapleAdder(threading.Thread):
 
         """
         sock.sendall((command + "\n").encode())
-        buff = StringIO()
+        buff = bytearray()
         # Get new response.
         while True:
             try:
                 chunk = sock.recv(SOCKET_BUFFER_SIZE)
                 if chunk:
-                    decoded_chunk = chunk.decode('ascii')
-                    buff.write(decoded_chunk)
+                    buff += chunk
                     # TODO: Find out what happens if several threads
                     # are talking to HAProxy on this socket
-                    if '> ' in decoded_chunk:
+                    # The prompt is the last thing HAProxy sends, so only the
+                    # end of the response needs to be checked.
+                    if buff.endswith(b'> '):
                         break
                 else:
                     break
@@ -225,21 +351,77 @@ class StapleAdder(threading.Thread):
                     raise
 
         # Strip *all* \n, > and space characters from the end
-        response = buff.getvalue().strip('\n> ')
-        buff.close()
-        return response
+        return buff.decode('ascii').strip('\n> ')
 
-    def send(self, paths, command):
+    @staticmethod
+    def _drain(sock):
         """
-        Send the command through the sockets at ``paths``.
+        Discard any data that is waiting on the ``socket``.
 
-        :param str|list paths: The path(s) to the socket(s) which should
-            already be open.
-        :param str command: String with the HAProxy command. For a list of
-            possible commands, see the `haproxy documentation`_
-        :return list: List of tuples containing path and response from HAProxy.
+        Anything HAProxy sent before we send new commands is not a response
+        to them, and would be mistaken for one.
+
+        :param socket.socket sock: An already opened socket.
+        :raises BrokenPipeError: If HAProxy closed the socket, e.g. because
+            the CLI timeout expired.
+        """
+        while select.select([sock], [], [], 0)[0]:
+            chunk = sock.recv(SOCKET_BUFFER_SIZE)
+            if not chunk:
+                raise BrokenPipeError(errno.EPIPE, "Socket closed by HAProxy")
+            LOG.debug("Discarding unexpected data from HAProxy: %s", chunk)
+
+    @staticmethod
+    def _send_many(sock, commands):
+        """
+        Send several commands through the ``socket`` at once.
+
+        HAProxy handles the commands one by one and ends each response with a
+        prompt, so this only works after the ``prompt`` command was sent.
+
+        :param list sock: An already opened socket.
+        :param list commands: Strings with HAProxy commands.
+        :return list: The response to each command, responses that were not
+            received because HAProxy closed the socket are empty, and the
+            socket is closed too in that case.
         :raises IOError if an error occurs and it's not errno.EAGAIN or
             errno.EINTR
+        :raises socket.timeout: If HAProxy doesn't respond to all commands
+            within :const:`SOCKET_TIMEOUT` seconds.
+        """
+        StapleAdder._drain(sock)
+        sock.sendall("".join(
+            "{}\n".format(command) for command in commands
+        ).encode())
+        buff = bytearray()
+        # Responses are short, so counting the prompts in the whole buffer
+        # after each chunk is cheap.
+        while len(PROMPT.findall(buff)) < len(commands) \
+                or not buff.endswith(b'> '):
+            try:
+                chunk = sock.recv(SOCKET_BUFFER_SIZE)
+                if not chunk:
+                    sock.close()
+                    break
+                buff += chunk
+            except IOError as err:
+                if err.errno not in (errno.EAGAIN, errno.EINTR):
+                    raise
+        responses = [
+            response.decode('ascii').strip('\n> ')
+            for response in PROMPT.split(bytes(buff))
+        ][:len(commands)]
+        return responses + [''] * (len(commands) - len(responses))
+
+    def send(self, path, commands):
+        """
+        Send the commands through the socket at ``path``.
+
+        :param str path: The path to the socket which should already be open.
+        :param list commands: Strings with HAProxy commands. For a list of
+            possible commands, see the `haproxy documentation`_
+        :return list: The response from HAProxy to each command, empty if the
+            socket can't be used.
 
         .. _haproxy documentation:
             http://haproxy.tech-notes.net/9-2-unix-socket-commands/
@@ -247,16 +429,25 @@ class StapleAdder(threading.Thread):
         """
         responses = []
         with stapled_except_handle():
-            if not isinstance(paths, (list, tuple)):
-                paths = [paths]
-            for path in paths:
+            try:
                 try:
                     sock = self.socks[path]
-                    response = self._send(sock, "{}\n".format(command))
+                    responses = self._send_many(sock, commands)
                 except (BrokenPipeError, KeyError):
                     sock = self._re_open_socket(path)
-                    response = self._send(sock, "{}\n".format(command))
-
-                LOG.debug("Received HAProxy response '%s'", response)
-                responses.append((path, response))
+                    responses = self._send_many(sock, commands)
+                if sock.fileno() == -1:
+                    # HAProxy closed the socket before it responded to all
+                    # commands.
+                    self._close_socket(path)
+            except socket.timeout:
+                # Late responses would be mistaken for responses to the next
+                # commands, start a new conversation next time.
+                self._close_socket(path)
+                raise stapled.core.exceptions.SocketError(
+                    "Timed out waiting for a response from socket {}".format(
+                        path
+                    )
+                )
+            LOG.debug("Received HAProxy responses '%s'", responses)
         return responses
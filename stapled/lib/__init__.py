@@ -8,21 +8,30 @@ This is meant for libraries that have a free license and that are not available
 as debian packages. We package them along with stapled, so we don't have to
 install them using PIP.
 """
+import functools
 import os
 import sys
 
+#: Entries of the lib directory that are not libs.
+EXCLUDE = frozenset(('__init__.py', '__init__.pyc', '__pycache__'))
 
+
+@functools.lru_cache(maxsize=None)
 def _libs():
     """
     Make a dict containing the name and path of each of the libs.
 
+    The lib directory doesn't change while running, so it is only listed
+    once, don't change the returned dict.
+
     :return dict: name of the lib as key, path of the lib as value
     """
-    exclude = ('__init__.py', '__init__.pyc', '__pycache__')
     lib_dir = os.path.relpath(os.path.dirname(__file__))
     # Filter out self
-    libs = filter(lambda p: p not in exclude, os.listdir(lib_dir))
-    return dict((lib, os.path.join(lib_dir, lib)) for lib in libs)
+    return dict(
+        (entry.name, os.path.join(lib_dir, entry.name))
+        for entry in os.scandir(lib_dir) if entry.name not in EXCLUDE
+    )
 
 
 def find_lib_paths():
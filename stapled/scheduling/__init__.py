@@ -291,6 +291,22 @@ class SchedulerThread(threading.Thread):
             raise QueueError("No such queue \"{}\".".format(task_name))
         return self._queues[task_name].get(blocking, timeout)
 
+    def wake_consumer(self, task_name):
+        """
+        Wake up one worker thread that waits for a task from ``task_name``.
+
+        :meth:`get_task` returns None to the woken up thread instead of a
+        task context, which should be marked done with :meth:`task_done` as
+        well. This lets worker threads block on :meth:`get_task` without a
+        timeout and still notice that they should stop.
+
+        :param str task_name: The task queue name.
+        :raises QueueError: If the task queue does not exist.
+        """
+        if task_name not in self._queues:
+            raise QueueError("No such queue \"{}\".".format(task_name))
+        self._queues[task_name].put(None)
+
     def task_done(self, task_name):
         """
         Mark a queue task done, upping the queue's counter of completed tasks.
@@ -0,0 +1,73 @@
+"""
+Test finding certificate files in the configured paths.
+"""
+
+# pylint: disable=no-self-use
+# pylint: disable=invalid-name
+# pylint: disable=protected-access
+
+import os
+from stapled.core.certfinder import CertFinderThread
+
+
+class FakeScheduler(object):
+    """Keep the task contexts that were added."""
+
+    def __init__(self):
+        self.contexts = []
+
+    def add_task(self, context):
+        self.contexts.append(context)
+
+
+def make_finder(*cert_paths):
+    """Make a recursive finder for ``.pem`` files in ``cert_paths``."""
+    return CertFinderThread(
+        models={},
+        cert_paths=[os.path.realpath(path) for path in cert_paths],
+        scheduler=FakeScheduler(),
+        file_extensions=frozenset(['pem']),
+        recursive=True
+    )
+
+
+def touch(*parts):
+    """Create an empty file."""
+    open(os.path.join(*parts), 'w').close()
+
+
+class TestFindNewCerts(object):
+    """Test scanning the configured paths for new certificates."""
+
+    def test_symlinked_nested_cert_path(self, tmpdir):
+        """
+        A configured path that is nested in another configured path is only
+        scanned on its own, also when it's reached through a symlink.
+        """
+        root = str(tmpdir.mkdir("root"))
+        real = str(tmpdir.mkdir("real"))
+        nested = os.path.join(real, "nested")
+        os.mkdir(nested)
+        # The nested path is only inside the root path through the symlink.
+        os.symlink(real, os.path.join(root, "link"))
+        touch(root, "top.pem")
+        touch(real, "mid.pem")
+        touch(nested, "deep.pem")
+        finder = make_finder(root, nested)
+        finder._find_new_certs(finder.cert_paths)
+        models = [context.model for context in finder.scheduler.contexts]
+        names = sorted(
+            os.path.basename(model.filename) for model in models
+        )
+        assert names == ["deep.pem", "mid.pem", "top.pem"]
+        assert os.path.join(
+            os.path.realpath(root), "link", "mid.pem"
+        ) in finder.models
+        deep = [
+            model for model in models
+            if model.filename.endswith("deep.pem")
+        ]
+        assert deep[0].filename == os.path.join(
+            os.path.realpath(nested), "deep.pem"
+        )
+        assert deep[0].cert_path == os.path.realpath(nested)
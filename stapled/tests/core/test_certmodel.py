@@ -0,0 +1,80 @@
+"""
+Test loading certificate files in PEM and DER format.
+"""
+
+# pylint: disable=no-self-use
+# pylint: disable=invalid-name
+# pylint: disable=protected-access
+
+import base64
+import os
+import pytest
+from stapled.core.certmodel import CertModel
+from stapled.core.exceptions import CertParsingError
+
+CERT_DIR = os.path.join(os.path.dirname(__file__), os.pardir, '.certs')
+
+
+def read_der(name):
+    """Read a DER encoded test certificate."""
+    with open(os.path.join(CERT_DIR, name), 'rb') as der_file:
+        return der_file.read()
+
+
+def armor(der_bytes):
+    """Encode a DER certificate as a PEM block."""
+    data = base64.b64encode(der_bytes)
+    lines = [data[i:i + 64] for i in range(0, len(data), 64)]
+    return (
+        b'-----BEGIN CERTIFICATE-----\n' + b'\n'.join(lines) +
+        b'\n-----END CERTIFICATE-----\n'
+    )
+
+
+EE_DER = read_der('ee.der')
+CA_DER = read_der('ca.der')
+
+
+def load(tmpdir, data):
+    """Write ``data`` to a certificate file and load its chain."""
+    path = tmpdir.join("cert.pem")
+    path.write_binary(data)
+    model = CertModel(str(path), str(tmpdir))
+    model._read_crt_file()
+    model._read_full_chain()
+    return model
+
+
+class TestLoadCertificates(object):
+    """Test finding the end entity and the chain in certificate files."""
+
+    @pytest.mark.parametrize("data", [
+        armor(EE_DER) + armor(CA_DER),
+        # Explanatory text before the blocks, as written by e.g. openssl.
+        b'subject=/CN=example.com\n' + armor(EE_DER) + armor(CA_DER),
+        # Text that starts with the same byte as DER data, "0".
+        b'0 s:CN = example.com\n' + armor(EE_DER) + armor(CA_DER),
+        # A single DER file can hold several certificates.
+        EE_DER + CA_DER,
+        CA_DER + EE_DER,
+    ])
+    def test_chain(self, tmpdir, data):
+        """The end entity and the CA are found in PEM and DER files."""
+        model = load(tmpdir, data)
+        assert model.end_entity.dump() == EE_DER
+        assert [crt.dump() for crt in model.intermediates] == [CA_DER]
+        assert model.ocsp_urls == ['http://ocsp.example.com']
+
+    def test_der_without_chain(self, tmpdir):
+        """A DER file with only the end entity misses the chain."""
+        with pytest.raises(CertParsingError):
+            load(tmpdir, EE_DER)
+
+    @pytest.mark.parametrize("data", [
+        (EE_DER + CA_DER)[:-10],
+        b'0 not a certificate',
+    ])
+    def test_invalid(self, tmpdir, data):
+        """Truncated or invalid data raises a CertParsingError."""
+        with pytest.raises(CertParsingError):
+            load(tmpdir, data)
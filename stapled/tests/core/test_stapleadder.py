@@ -0,0 +1,354 @@
+"""
+Test sending OCSP staples to HAProxy sockets.
+"""
+
+# pylint: disable=no-self-use
+# pylint: disable=invalid-name
+# pylint: disable=protected-access
+
+import os
+import socket
+import threading
+import pytest
+from stapled.core import stapleadder
+from stapled.core.stapleadder import StapleAdder
+from stapled.core.taskcontext import StapleTaskContext
+
+UPDATED = b'OCSP Response updated!\n'
+
+
+class FakeHAProxy(object):
+    """
+    Listen on a UNIX socket and answer like HAProxy in prompt mode.
+
+    ``respond`` is called with each received command and returns the bytes
+    to send back, or None to close the connection.
+    """
+
+    def __init__(self, path, respond):
+        self.path = path
+        self.respond = respond
+        self.commands = []
+        self.connections = 0
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(5)
+        thread = threading.Thread(target=self.serve)
+        thread.daemon = True
+        thread.start()
+
+    def serve(self):
+        """Accept connections until the server socket is closed."""
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            self.connections += 1
+            thread = threading.Thread(target=self.handle, args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+    def handle(self, conn):
+        """Answer the commands of a single connection."""
+        buff = b''
+        with conn:
+            while True:
+                chunk = conn.recv(65536)
+                if not chunk:
+                    return
+                buff += chunk
+                while b'\n' in buff:
+                    command, buff = buff.split(b'\n', 1)
+                    command = command.decode('ascii')
+                    if command == 'prompt' or \
+                            command.startswith('set timeout'):
+                        conn.sendall(b'\n> ')
+                        continue
+                    self.commands.append(command)
+                    response = self.respond(command)
+                    if response is None:
+                        return
+                    conn.sendall(response)
+
+    def close(self):
+        """Stop accepting connections."""
+        self.server.close()
+
+
+class FakeScheduler(object):
+    """Keep the contexts that were rescheduled after an error."""
+
+    def __init__(self):
+        self.rescheduled = []
+
+    def add_task(self, context):
+        self.rescheduled.append(context)
+
+    def wake_consumer(self, task_name):
+        pass
+
+
+class Staple(object):
+    """An OCSP staple with a fixed base64 encoding."""
+
+    def __init__(self, base64):
+        self.base64 = base64
+
+
+class Model(object):
+    """A certificate model with only what the StapleAdder uses."""
+
+    def __init__(self, filename, staple, cert_path='/etc/ssl/private'):
+        self.filename = filename
+        self.cert_path = cert_path
+        self.ocsp_staple = Staple(staple)
+
+
+def staple_of(command):
+    """Get the staple from a ``set ssl ocsp-response`` command."""
+    return command.rpartition(' ')[2]
+
+
+@pytest.fixture
+def make_adder(tmpdir):
+    """
+    Make a StapleAdder with a fake HAProxy behind its socket.
+
+    :return function: Takes a ``respond`` function for :class:`FakeHAProxy`
+        and returns the adder, the fake HAProxy and the scheduler.
+    """
+    servers = []
+    adders = []
+
+    def make(respond):
+        path = os.path.join(str(tmpdir), "haproxy.sock")
+        server = FakeHAProxy(path, respond)
+        servers.append(server)
+        scheduler = FakeScheduler()
+        adder = StapleAdder(
+            haproxy_socket_mapping={'/etc/ssl/private': [path]},
+            haproxy_socket_keepalive=10,
+            scheduler=scheduler
+        )
+        adders.append(adder)
+        return adder, server, scheduler
+
+    yield make
+    for adder in adders:
+        adder._executor.shutdown()
+        for sock in adder.socks.values():
+            sock.close()
+    for server in servers:
+        server.close()
+
+
+def make_contexts(scheduler, *staples):
+    """Make a task context for each staple, with its own certificate file."""
+    contexts = []
+    for index, staple in enumerate(staples):
+        context = StapleTaskContext(
+            task_name=StapleAdder.TASK_NAME,
+            model=Model("cert{}.pem".format(index), staple)
+        )
+        context.scheduler = scheduler
+        contexts.append(context)
+    return contexts
+
+
+def reply(sock, lines, response, close=False):
+    """
+    Send ``response`` from a thread once ``lines`` commands were received.
+
+    :return threading.Thread: The started thread.
+    """
+    def wait_and_reply():
+        buff = b''
+        while buff.count(b'\n') < lines:
+            buff += sock.recv(65536)
+        sock.sendall(response)
+        if close:
+            sock.close()
+    thread = threading.Thread(target=wait_and_reply)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+@pytest.fixture
+def socket_pair():
+    """A connected pair of sockets, the first one times out quickly."""
+    ours, theirs = socket.socketpair()
+    ours.settimeout(1)
+    yield ours, theirs
+    ours.close()
+    theirs.close()
+
+
+class TestSendMany(object):
+    """Test sending several commands to a socket at once."""
+
+    def test_pipelined_responses(self, socket_pair):
+        """Every command gets its own response, in order."""
+        ours, theirs = socket_pair
+        reply(theirs, 3, b'first\n> second\nline\n> \n> ')
+        assert StapleAdder._send_many(ours, ['a', 'b', 'c']) == [
+            'first', 'second\nline', ''
+        ]
+
+    def test_prompts_without_new_line(self, socket_pair):
+        """Empty responses may be a prompt directly after another prompt."""
+        ours, theirs = socket_pair
+        reply(theirs, 2, b'> > ')
+        assert StapleAdder._send_many(ours, ['a', 'b']) == ['', '']
+
+    def test_closed_socket(self, socket_pair):
+        """Responses that never came are empty."""
+        ours, theirs = socket_pair
+        reply(theirs, 3, b'first\n> ', close=True)
+        assert StapleAdder._send_many(ours, ['a', 'b', 'c']) == [
+            'first', '', ''
+        ]
+
+    def test_stale_data(self, socket_pair):
+        """Data sent before the commands is not taken for a response."""
+        ours, theirs = socket_pair
+        theirs.sendall(b'stale\n> ')
+        reply(theirs, 1, b'fresh\n> ')
+        assert StapleAdder._send_many(ours, ['a']) == ['fresh']
+
+    def test_timeout(self, socket_pair):
+        """A socket that doesn't respond in time raises socket.timeout."""
+        ours, theirs = socket_pair
+        ours.settimeout(0.1)
+        reply(theirs, 2, b'first\n> ')
+        with pytest.raises(socket.timeout):
+            StapleAdder._send_many(ours, ['a', 'b'])
+
+
+class TestAddStaples(object):
+    """Test sending staples and handling the responses per context."""
+
+    def test_batch(self, make_adder):
+        """All staples are sent, only failed contexts are rescheduled."""
+        adder, server, scheduler = make_adder(
+            lambda command: UPDATED + b'\n> '
+            if staple_of(command) != 'bad' else b'Invalid staple\n\n> '
+        )
+        contexts = make_contexts(scheduler, 'one', 'bad', 'three')
+        adder.add_staples(contexts)
+        assert [staple_of(command) for command in server.commands] == [
+            'one', 'bad', 'three'
+        ]
+        assert scheduler.rescheduled == [contexts[1]]
+        assert sorted(adder.sent_staples.values()) == ['one', 'three']
+
+    def test_skip_sent_staples(self, make_adder):
+        """Staples that HAProxy already has are not sent again."""
+        adder, server, scheduler = make_adder(
+            lambda command: UPDATED + b'\n> '
+        )
+        adder.add_staples(make_contexts(scheduler, 'one', 'two'))
+        adder.add_staples(make_contexts(scheduler, 'one', 'new'))
+        assert [staple_of(command) for command in server.commands] == [
+            'one', 'two', 'new'
+        ]
+        assert not scheduler.rescheduled
+
+    def test_closed_connection(self, make_adder):
+        """
+        Staples without a response are rescheduled, the socket is opened
+        again for the next staples.
+        """
+        adder, server, scheduler = make_adder(
+            lambda command: UPDATED + b'\n> '
+            if staple_of(command) != 'close' else None
+        )
+        contexts = make_contexts(scheduler, 'one', 'close', 'three')
+        adder.add_staples(contexts)
+        assert scheduler.rescheduled == contexts[1:]
+        assert not adder.socks
+        # The next staples are sent over a new connection.
+        adder.add_staples(make_contexts(scheduler, 'new'))
+        assert server.connections == 2
+        assert staple_of(server.commands[-1]) == 'new'
+
+    def test_timeout(self, make_adder, monkeypatch):
+        """A socket that doesn't respond in time is closed."""
+        monkeypatch.setattr(stapleadder, 'SOCKET_TIMEOUT', 0.1)
+        adder, _, scheduler = make_adder(lambda command: b'')
+        contexts = make_contexts(scheduler, 'one')
+        adder.add_staples(contexts)
+        assert scheduler.rescheduled == contexts
+        assert not adder.socks
+
+    def test_several_sockets(self, tmpdir):
+        """
+        Staples are sent to every socket of a certificate path, using a pool
+        of workers that stops with the adder.
+        """
+        paths = [
+            os.path.join(str(tmpdir), "haproxy{}.sock".format(index))
+            for index in range(3)
+        ]
+        servers = [
+            FakeHAProxy(path, lambda command: UPDATED + b'\n> ')
+            for path in paths
+        ]
+        scheduler = FakeScheduler()
+        adder = StapleAdder(
+            haproxy_socket_mapping={
+                '/etc/ssl/private': paths[:2],
+                '/etc/ssl/other': paths[1:],
+            },
+            haproxy_socket_keepalive=10,
+            scheduler=scheduler
+        )
+        try:
+            adder.add_staples(make_contexts(scheduler, 'one'))
+            adder.add_staples(make_contexts(scheduler, 'two', 'three'))
+            assert [len(server.commands) for server in servers] == [3, 3, 0]
+            assert not scheduler.rescheduled
+        finally:
+            # Stop the thread before it waits for a task, like the daemon.
+            adder.stop = True
+            adder.run()
+            for sock in adder.socks.values():
+                sock.close()
+            for server in servers:
+                server.close()
+        assert adder._executor._shutdown
+
+    def test_sockets_added_on_reload(self, tmpdir):
+        """Sockets added to the mapping later are also used in parallel."""
+        paths = [
+            os.path.join(str(tmpdir), "haproxy{}.sock".format(index))
+            for index in range(2)
+        ]
+        # Each socket only responds once the other one received its staple
+        # too, which only happens if they are used at the same time.
+        barrier = threading.Barrier(2, timeout=5)
+
+        def respond(command):
+            barrier.wait()
+            return UPDATED + b'\n> '
+
+        servers = [FakeHAProxy(path, respond) for path in paths]
+        scheduler = FakeScheduler()
+        adder = StapleAdder(
+            haproxy_socket_mapping={'/etc/ssl/private': paths[:1]},
+            haproxy_socket_keepalive=10,
+            scheduler=scheduler
+        )
+        try:
+            adder.haproxy_socket_mapping = {'/etc/ssl/private': paths}
+            adder.add_staples(make_contexts(scheduler, 'one'))
+            assert [len(server.commands) for server in servers] == [1, 1]
+            assert not scheduler.rescheduled
+        finally:
+            adder.stop = True
+            adder.run()
+            for sock in adder.socks.values():
+                sock.close()
+            for server in servers:
+                server.close()
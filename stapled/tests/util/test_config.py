@@ -0,0 +1,81 @@
+"""
+Test config file parsing functions.
+"""
+
+# pylint: disable=no-self-use
+# pylint: disable=invalid-name
+
+import argparse
+import pytest
+from stapled.util.config import parse_config_file
+from stapled.util.config import config_to_args
+
+
+@pytest.fixture
+def parser():
+    """Make a small parser with the kinds of arguments stapled uses."""
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--daemon', action='store_true', default=False)
+    arg_parser.add_argument('--renewal-threads', type=int, default=2)
+    arg_parser.add_argument('--cert-paths', nargs='+', default=[])
+    return arg_parser
+
+
+def test_parse_config_file(tmpdir):
+    """
+    Test that sections and comments are skipped and values are parsed.
+    """
+    config = tmpdir.join('stapled.conf')
+    config.write(
+        "[section]\n"
+        ";; A comment\n"
+        "# Another comment\n"
+        "cert-paths=[/etc/ssl/private, /etc/ssl/other]\n"
+        "renewal-threads = 5 ; inline comment\n"
+        "daemon\n"
+    )
+    assert parse_config_file(str(config)) == [
+        ('cert-paths', ['/etc/ssl/private', '/etc/ssl/other']),
+        ('renewal-threads', '5'),
+        ('daemon', 'true'),
+    ]
+
+
+def test_config_to_args(parser):
+    """
+    Test that settings are converted to arguments the parser accepts.
+    """
+    args = config_to_args([
+        ('cert-paths', ['/etc/ssl/private', '/etc/ssl/other']),
+        ('renewal-threads', '5'),
+        ('daemon', 'true'),
+    ], parser)
+    assert args == [
+        '--cert-paths', '/etc/ssl/private', '/etc/ssl/other',
+        '--renewal-threads=5',
+        '--daemon'
+    ]
+    parsed = parser.parse_args(args + ['--renewal-threads', '3'])
+    assert parsed.cert_paths == ['/etc/ssl/private', '/etc/ssl/other']
+    assert parsed.renewal_threads == 3
+    assert parsed.daemon
+
+
+def test_config_to_args_disabled_flag(parser):
+    """
+    Test that a flag set to false is not passed.
+    """
+    assert config_to_args([('daemon', 'false')], parser) == []
+
+
+@pytest.mark.parametrize("items", [
+    [('unknown', 'true')],
+    [('daemon', 'maybe')],
+    [('renewal-threads', ['1', '2'])],
+])
+def test_config_to_args_invalid(parser, items):
+    """
+    Test that unknown settings and invalid values raise a ValueError.
+    """
+    with pytest.raises(ValueError):
+        config_to_args(items, parser)
@@ -59,7 +59,10 @@ class TestUnique(object):
         ([1, 2, 2, 3, 'a', 4, 4, 1], [1, 2, 3, 'a', 4]),
         ([4, 2, 2, 3, 'a', 4, 4, 1], [4, 2, 3, 'a', 1]),
         ((1, 2, 2, 3, 'a', 4, 4, 1), (1, 2, 3, 'a', 4)),
-        ((4, 2, 2, 3, 'a', 4, 4, 1), (4, 2, 3, 'a', 1))
+        ((4, 2, 2, 3, 'a', 4, 4, 1), (4, 2, 3, 'a', 1)),
+        (['b', 'a', 'b'], ['b', 'a']),
+        (('b', 'a', 'b', 'a'), ('b', 'a')),
+        ([], [])
     ]
 
     @pytest.mark.parametrize("data,expected", UNIQUE_TEST_DATA)
@@ -0,0 +1,81 @@
+"""
+Test the inotify wrapper.
+"""
+
+# pylint: disable=no-self-use
+# pylint: disable=invalid-name
+
+import os
+import threading
+import pytest
+from stapled.util import inotify
+
+
+@pytest.fixture
+def notifier():
+    """An inotify instance, tests are skipped if inotify is not available."""
+    try:
+        instance = inotify.INotify()
+    except OSError as exc:
+        pytest.skip("inotify is not available: {}".format(exc))
+    yield instance
+    instance.close()
+
+
+class TestINotify(object):
+    """Test the INotify class."""
+
+    def test_create_and_delete(self, notifier, tmpdir):
+        """Creating and deleting files in a watched directory is reported."""
+        wd = notifier.add_watch(
+            str(tmpdir), inotify.IN_CREATE | inotify.IN_DELETE
+        )
+        path = tmpdir.join("cert.pem")
+        path.write("certificate")
+        path.remove()
+        events = notifier.read()
+        assert [(event.wd, event.name) for event in events] == [
+            (wd, "cert.pem"), (wd, "cert.pem")
+        ]
+        assert events[0].mask & inotify.IN_CREATE
+        assert events[1].mask & inotify.IN_DELETE
+
+    def test_watch_file(self, notifier, tmpdir):
+        """Events on a watched file itself have no name."""
+        path = tmpdir.join("cert.pem")
+        path.write("certificate")
+        notifier.add_watch(str(path), inotify.IN_MODIFY)
+        path.write("new certificate")
+        events = notifier.read()
+        assert events[0].name == ""
+        assert events[0].mask & inotify.IN_MODIFY
+
+    def test_missing_path(self, notifier, tmpdir):
+        """Watching a path that doesn't exist raises an OSError."""
+        with pytest.raises(OSError):
+            notifier.add_watch(
+                os.path.join(str(tmpdir), "missing"), inotify.IN_CREATE
+            )
+
+    def test_closed(self, notifier):
+        """Reading from a closed instance raises an OSError."""
+        notifier.close()
+        assert notifier.closed
+        with pytest.raises(OSError):
+            notifier.read()
+
+    def test_interrupt(self, notifier, tmpdir):
+        """A thread waiting for events can be woken up to stop it."""
+        notifier.add_watch(str(tmpdir), inotify.IN_CREATE)
+        results = []
+        reader = threading.Thread(
+            target=lambda: results.append(notifier.read())
+        )
+        reader.start()
+        notifier.interrupt()
+        reader.join(5)
+        assert not reader.is_alive()
+        assert results == [[]]
+        # Events after the interruption are not read anymore.
+        tmpdir.join("cert.pem").write("certificate")
+        assert notifier.read() == []
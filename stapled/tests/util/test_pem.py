@@ -0,0 +1,81 @@
+"""
+Test decoding PEM data.
+"""
+
+# pylint: disable=no-self-use
+# pylint: disable=invalid-name
+
+import base64
+import binascii
+import pytest
+from stapled.util.pem import unarmor
+
+CERT_DER = bytes(range(256)) * 3
+KEY_DER = b'private key data'
+
+
+def armor(type_name, der_bytes, headers=b''):
+    """Encode DER bytes as a PEM block with lines of 64 characters."""
+    data = base64.b64encode(der_bytes)
+    lines = [data[i:i + 64] for i in range(0, len(data), 64)]
+    return (
+        b'-----BEGIN ' + type_name + b'-----\n' + headers +
+        b'\n'.join(lines) +
+        b'\n-----END ' + type_name + b'-----\n'
+    )
+
+
+class TestUnarmor(object):
+    """Test the unarmor function."""
+
+    def test_multiple_blocks(self):
+        """All blocks are decoded in order, other text is ignored."""
+        data = (
+            b'subject=/CN=example.com\n' +
+            armor(b'CERTIFICATE', CERT_DER) +
+            armor(b'CERTIFICATE', KEY_DER) +
+            b'\r\n' +
+            armor(b'RSA PRIVATE KEY', KEY_DER)
+        )
+        assert list(unarmor(data)) == [
+            ('CERTIFICATE', {}, CERT_DER),
+            ('CERTIFICATE', {}, KEY_DER),
+            ('RSA PRIVATE KEY', {}, KEY_DER),
+        ]
+
+    def test_crlf(self):
+        """Windows line endings are allowed."""
+        data = armor(b'CERTIFICATE', CERT_DER).replace(b'\n', b'\r\n')
+        assert list(unarmor(data)) == [('CERTIFICATE', {}, CERT_DER)]
+
+    def test_headers(self):
+        """Headers are returned separately from the data."""
+        data = armor(
+            b'RSA PRIVATE KEY',
+            KEY_DER,
+            headers=b'Proc-Type: 4,ENCRYPTED\nDEK-Info: AES-128-CBC,00FF\n\n'
+        )
+        assert list(unarmor(data)) == [(
+            'RSA PRIVATE KEY',
+            {'Proc-Type': '4,ENCRYPTED', 'DEK-Info': 'AES-128-CBC,00FF'},
+            KEY_DER
+        )]
+
+    def test_no_blocks(self):
+        """Data without PEM blocks raises a ValueError."""
+        with pytest.raises(ValueError):
+            list(unarmor(b'not a certificate'))
+
+    def test_mismatched_end(self):
+        """A block that ends with another type is not a block."""
+        data = armor(b'CERTIFICATE', CERT_DER).replace(
+            b'END CERTIFICATE', b'END PRIVATE KEY'
+        )
+        with pytest.raises(ValueError):
+            list(unarmor(data))
+
+    def test_invalid_base64(self):
+        """Invalid base64 data raises a binascii.Error."""
+        data = b'-----BEGIN CERTIFICATE-----\nAAA\n-----END CERTIFICATE-----'
+        with pytest.raises(binascii.Error):
+            list(unarmor(data))
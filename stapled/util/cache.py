@@ -3,15 +3,22 @@ Defines a class that can be used as a decorator that will cache returns of a
 method for a set of arguments and/or keyword arguments. If the arguments are
 the same as the first time, it will take the result out of the cache.
 """
-import collections
 import functools
 
+#: Maximum amount of results cached when no size is given, so the cache can't
+#: keep growing in a long running daemon.
+DEFAULT_MAX_SIZE = 1024
 
-class cache(collections.OrderedDict):
+
+class cache(object):
     """
-    Class to mimic lru cache, a fifo cache with a maximum size that returns the
-    same result from cache if the same arguments are used on a method a second
-    time.
+    Decorator that returns the same result from cache if the same arguments
+    are used on a method a second time, the cache has a maximum size.
+
+    This is a thin wrapper around :func:`functools.lru_cache`, which is
+    implemented in C and thread-safe, so the least recently used result is
+    dropped when the cache is full. Pass ``None`` or ``0`` as ``max_size``
+    for a cache without a maximum size.
 
     .. Note:: This should be used as a decorator:
         .. code::
@@ -22,21 +29,10 @@ class cache(collections.OrderedDict):
                 else:
             return fib(n-1) + fib(n-2)
     """
-    def __init__(self, max_size=None):
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
         if max_size == 0:
             max_size = None
         self.max_size = max_size
-        super(cache, self).__init__()
 
-    def __call__(self, func, *args, **kwargs):
-        @functools.wraps(func)
-        def decorated(*args, **kwargs):
-            hashable = (args, tuple(kwargs.items()))
-            try:
-                return self[hashable]
-            except KeyError:
-                if self.max_size and len(self) >= self.max_size:
-                    self.popitem(False)
-                self[hashable] = func(*args, **kwargs)
-            return self[hashable]
-        return decorated
+    def __call__(self, func):
+        return functools.lru_cache(maxsize=self.max_size)(func)
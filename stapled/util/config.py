@@ -0,0 +1,132 @@
+"""
+Read stapled config files and convert them to command line arguments.
+
+The config file format is a simple INI-like format, any setting that is a
+valid long command line argument can be set in it:
+
+.. code-block:: ini
+
+    [section]
+    ;; Comments start with ``;`` or ``#``, section headers are ignored.
+    cert-paths=[/etc/ssl/private, /etc/ssl/other]
+    renewal-threads=5
+    ;; A setting without a value enables a flag.
+    daemon
+
+Settings are converted to command line arguments, so they are parsed and
+validated by the same :class:`argparse.ArgumentParser` as the command line.
+Arguments passed on the command line should come after the config file
+arguments so they take precedence.
+"""
+import os
+import re
+
+#: Matches ``key``, ``key=value``, ``key: value`` and ``key value`` lines with
+#: optional quotes around the value and an optional trailing comment.
+LINE_PATTERN = re.compile(
+    r'^(?P<key>[^:=;#\s]+)\s*'
+    r'(?:(?P<equal>[:=\s])\s*([\'"]?)(?P<value>.+?)?\3)?'
+    r'\s*(?:\s[;#]\s*(?P<comment>.*?)\s*)?$'
+)
+
+#: Values that enable a flag.
+TRUE_VALUES = ('true', 'yes', 'on', '1')
+
+#: Values that leave a flag disabled.
+FALSE_VALUES = ('false', 'no', 'off', '0')
+
+
+def find_config_file(locations):
+    """
+    Find the first config file that exists in ``locations``.
+
+    :param list locations: Config file paths in order of importance, ``~`` is
+        expanded to the user's home directory.
+    :return str|NoneType: Path to the config file or None if none exists.
+    """
+    for location in locations:
+        path = os.path.expanduser(location)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def parse_config_file(path):
+    """
+    Parse a config file into a list of settings.
+
+    :param str path: Path to the config file.
+    :return list: List of tuples of setting names and values, values are
+        strings or lists of strings.
+    :raises ValueError: If a line can't be parsed.
+    :raises OSError: If the file can't be read.
+    """
+    items = []
+    with open(path, 'r') as config:
+        for line_no, line in enumerate(config, 1):
+            line = line.strip()
+            # Skip empty lines, comments and section headers.
+            if not line or line[0] in '#;[':
+                continue
+            match = LINE_PATTERN.match(line)
+            if match is None:
+                raise ValueError(
+                    "Can't parse line {} of config file {}: {}".format(
+                        line_no, path, line
+                    )
+                )
+            key = match.group('key')
+            value = match.group('value')
+            if value is None:
+                # A bare key enables a flag.
+                value = 'true'
+            elif value.startswith('[') and value.endswith(']'):
+                value = [
+                    element.strip() for element in value[1:-1].split(',')
+                    if element.strip()
+                ]
+            items.append((key, value))
+    return items
+
+
+def config_to_args(items, parser):
+    """
+    Convert config file settings to command line arguments.
+
+    :param list items: Settings as returned by :func:`parse_config_file`.
+    :param argparse.ArgumentParser parser: The parser the arguments are meant
+        for, used to find out what kind of value each setting takes.
+    :return list: Command line arguments.
+    :raises ValueError: If a setting is unknown or has an invalid value.
+    """
+    # pylint: disable=protected-access
+    actions = parser._option_string_actions
+    args = []
+    for key, value in items:
+        option = "--{}".format(key)
+        try:
+            action = actions[option]
+        except KeyError:
+            raise ValueError("Unknown setting in config file: {}".format(key))
+        if action.nargs == 0:
+            # Flags such as ``daemon`` or ``recursive``.
+            if isinstance(value, list) or \
+                    value.lower() not in TRUE_VALUES + FALSE_VALUES:
+                raise ValueError(
+                    "Setting {} in config file should be a boolean, got: "
+                    "{}".format(key, value)
+                )
+            if value.lower() in TRUE_VALUES:
+                args.append(option)
+        elif isinstance(value, list):
+            if action.nargs not in ('+', '*') and \
+                    not (isinstance(action.nargs, int) and action.nargs > 1):
+                raise ValueError(
+                    "Setting {} in config file can't be a list.".format(key)
+                )
+            if value:
+                args.append(option)
+                args.extend(value)
+        else:
+            args.append("{}={}".format(option, value))
+    return args
@@ -0,0 +1,94 @@
+"""
+Detach the current process from the user's context and run it as a daemon.
+
+This does the same as the parts of `python-daemon`_'s ``DaemonContext`` that
+stapled uses, i.e. the "double fork" as described in chapter 13 of W. Richard
+Stevens' "Advanced Programming in the UNIX Environment":
+
+ - Fork, let the parent exit so we are not a process group leader.
+ - Start a new session so we have no controlling terminal.
+ - Fork again, so the session leader exits and we can never acquire a
+   controlling terminal again.
+ - Change the working directory to ``/`` and reset the umask.
+ - Close all file descriptors except the ones we need to keep.
+ - Redirect stdin, stdout and stderr to ``/dev/null``.
+
+``DaemonContext`` tries to close every possible file descriptor up to the
+file descriptor limit, which can take a long time when the limit is high, as
+it often is in containers. Here only the descriptors that are actually open
+are closed.
+
+.. _python-daemon: https://pypi.org/project/python-daemon/
+"""
+import os
+import resource
+import signal
+
+#: Directory that lists the open file descriptors of the current process.
+PROC_FD_DIR = "/proc/self/fd"
+
+
+def daemonise(files_preserve=None):
+    """
+    Detach the process and turn it into a daemon.
+
+    Returns in the daemonised child process, the parent processes exit.
+
+    :param list files_preserve: File objects or file descriptors that should
+        not be closed.
+    """
+    # Let the parent exit, the child is not a process group leader so it can
+    # start a new session.
+    if os.fork() > 0:
+        os._exit(0)  # pylint: disable=protected-access
+    os.setsid()
+    # Let the session leader exit so we can't acquire a controlling terminal.
+    if os.fork() > 0:
+        os._exit(0)  # pylint: disable=protected-access
+    os.chdir("/")
+    os.umask(0)
+    # Ignore terminal job control signals.
+    for signum in (signal.SIGTSTP, signal.SIGTTIN, signal.SIGTTOU):
+        signal.signal(signum, signal.SIG_IGN)
+
+    keep = set()
+    for file_obj in files_preserve or []:
+        if isinstance(file_obj, int):
+            keep.add(file_obj)
+        else:
+            keep.add(file_obj.fileno())
+    close_file_descriptors(keep | set((0, 1, 2)))
+    redirect_standard_streams()
+
+
+def close_file_descriptors(keep):
+    """
+    Close all open file descriptors except the ones in ``keep``.
+
+    :param set keep: File descriptors that should stay open.
+    """
+    try:
+        open_fds = [int(fd) for fd in os.listdir(PROC_FD_DIR)]
+    except OSError:
+        # No procfs, close everything up to the file descriptor limit.
+        max_fd = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+        if max_fd == resource.RLIM_INFINITY:
+            max_fd = os.sysconf("SC_OPEN_MAX")
+        open_fds = range(max_fd)
+    for fd in open_fds:
+        if fd in keep:
+            continue
+        try:
+            os.close(fd)
+        except OSError:
+            # Not open (anymore), e.g. the descriptor used to list PROC_FD_DIR
+            pass
+
+
+def redirect_standard_streams():
+    """Redirect stdin, stdout and stderr to ``/dev/null``."""
+    null_fd = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(null_fd, fd)
+    if null_fd > 2:
+        os.close(null_fd)
@@ -24,7 +24,13 @@ class ExitCodeTracker(logging.Handler):
         super(ExitCodeTracker, self).__init__()
         self.setLevel(level)
         self.level = level
-        self.logged = {'WARNING': 0, 'ERROR': 0, 'CRITICAL': 0}
+        # Counts are kept per level number, hashing an int is cheaper than
+        # hashing the level name of every record.
+        self.logged = {
+            logging.WARNING: 0,
+            logging.ERROR: 0,
+            logging.CRITICAL: 0
+        }
 
     def emit(self, record):
         """
@@ -32,11 +38,10 @@ class ExitCodeTracker(logging.Handler):
 
         :param logging.LogRecord
         """
-        if record.levelno >= self.level:
-            try:
-                self.logged[record.levelname] += 1
-            except KeyError:
-                self.logged[record.levelname] = 1
+        levelno = record.levelno
+        if levelno >= self.level:
+            # Custom levels are not in ``self.logged`` yet.
+            self.logged[levelno] = self.logged.get(levelno, 0) + 1
 
     @property
     def errors_occurred(self):
@@ -45,7 +50,7 @@ class ExitCodeTracker(logging.Handler):
 
         :returns int count of errors that occurred.
         """
-        return self.logged['ERROR'] + self.logged['CRITICAL']
+        return self.logged[logging.ERROR] + self.logged[logging.CRITICAL]
 
     @property
     def criticals_occurred(self):
@@ -54,7 +59,7 @@ class ExitCodeTracker(logging.Handler):
 
         :returns int count of criticals that occurred.
         """
-        return self.logged['CRITICAL']
+        return self.logged[logging.CRITICAL]
 
     @property
     def warnings_occurred(self):
@@ -63,7 +68,7 @@ class ExitCodeTracker(logging.Handler):
 
         :returns int count of warnings that occurred.
         """
-        return self.logged['WARNING']
+        return self.logged[logging.WARNING]
 
     def __str__(self):
         """
@@ -72,6 +77,9 @@ class ExitCodeTracker(logging.Handler):
         :returns str Formatted string of logged criticals, errors and warnings.
         """
         return (
-            "Critical errors: {CRITICAL}, errors: {ERROR}, warnings: "
-            "{WARNING}"
-        ).format(**self.logged)
+            "Critical errors: {}, errors: {}, warnings: {}"
+        ).format(
+            self.criticals_occurred,
+            self.logged[logging.ERROR],
+            self.warnings_occurred
+        )
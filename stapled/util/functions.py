@@ -4,6 +4,10 @@ Just a module containing some useful auxiliary functions.
 
 import binascii
 
+#: Sequences up to this length are de-duplicated by scanning a list, which is
+#: faster than building a set for a handful of values.
+SMALL_SEQUENCE_LEN = 4
+
 
 def pretty_base64(data, line_len=79, prefix="", suffix="\n"):
     """
@@ -16,9 +20,11 @@ def pretty_base64(data, line_len=79, prefix="", suffix="\n"):
     :param int line_len: Maximum length of the returned lines.
     :return str: Formatted string.
     """
-    b64_data = base64(data)
-    b64_data = split_by_len(b64_data, line_len)
-    b64_data = "".join(["{}{}{}".format(prefix, x, suffix) for x in b64_data])
+    lines = split_by_len(base64(data), line_len)
+    if not lines:
+        return ""
+    # Join the lines with the suffix and prefix in between, in one go.
+    b64_data = prefix + (suffix + prefix).join(lines) + suffix
     return b64_data.strip("\n")
 
 
@@ -32,14 +38,12 @@ def base64(data):
     :return str: Empty string if this failed, otherwise the base64 encoded
         string.
     """
-    if isinstance(data, (bytearray, bytes)):
-        b64_data = binascii.b2a_base64(data).decode('ascii')
-    else:
+    if not isinstance(data, (bytearray, bytes)):
         raise TypeError('Data passed to base64 function is of the wrong type')
-
-    # Remove any new lines and carriage returns
-    b64_data.replace("\n", "").replace("\r", "")
-    return b64_data.strip("\n")
+    # b2a_base64 never wraps lines, it only appends a single new line, which
+    # we cut off before decoding. The ``newline`` argument that does this is
+    # not available before Python 3.6.
+    return binascii.b2a_base64(data)[:-1].decode('ascii')
 
 
 def split_by_len(string, length):
@@ -66,13 +70,22 @@ def unique(seq, preserve_order=True):
     :param bool preserve_order: Preserve order of seq? (Default: True)
     :returns list|tuple: Whatever unique values you fed into ``seq``.
     """
-    if preserve_order:
-        return type(seq)(unique_generator(seq))
-
     if isinstance(seq, (set, dict)):
         # Should not do this, this is wasting CPU cycles.
         raise TypeError("{} types are always unique".format(type(seq)))
 
+    if len(seq) <= SMALL_SEQUENCE_LEN:
+        # Mostly lists of one or two sockets or cert paths, the order is
+        # preserved either way.
+        unique_values = []
+        for element in seq:
+            if element not in unique_values:
+                unique_values.append(element)
+        return type(seq)(unique_values)
+
+    if preserve_order:
+        return type(seq)(unique_generator(seq))
+
     # If order is not important we can do set() which is a C implementation
     # and it's super fast. Return a new sequence of the same type with
     # unique values
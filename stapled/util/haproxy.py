@@ -41,13 +41,18 @@ If more than one socket is specified in the config file we will only
 use the first one.
 """
 import re
-import os
+from concurrent.futures import ThreadPoolExecutor
 from stapled.util.functions import unique
 
+#: Maximum amount of threads used to parse HAProxy config files concurrently.
+MAX_PARSER_THREADS = 8
+
 
 class HAProxyParser(object):
     """Parse a HAProxy config file and extract cert paths and socket paths."""
 
+    __slots__ = ('conf_files', 'cert_paths', 'socket_paths')
+
     #: Matches a path pattern, only `a-Z, 0-9, -_/\.`, quoted strings with the
     #: same pattern but allowing spaces too, and non-quoted patterns with the
     #: same content and escaped spaces, e.g.:
@@ -59,25 +64,31 @@ class HAProxyParser(object):
     #: strong and weak quoting, i.e.: backslashes are literal when in single
     #: quote, but are escape characters in double quotes.
     PATH_PATTERN = (
-        r'('
-        r'([\"])([\w.\\/ \-\']*)\2'  # Matches weakly quoted paths
-        r'|([\'])([\w.\\/ \-\']*)\4'  # Matches strongly quotes paths
-        r'|([\w.\-/\']|\\ )'  # Matches unquoted paths (escaped spaces too)
-        r'*)'
+        r'(?:'
+        r'"[\w.\\/ \-\']*"'  # Matches weakly quoted paths
+        r"|'[\w.\\/ \-\']*'"  # Matches strongly quotes paths
+        r'|[\w.\-/\']|\\ '  # Matches unquoted paths (escaped spaces too)
+        r')*'
     )
 
     #: Remove backslashes from escaped characters.
     PAT_UNESCAPE = re.compile(r'\\(.)')
 
     # We will try to find the following directives with the same path pattern
-    # every time.
+    # every time, the whole file is scanned once for all of them. The named
+    # group that matched tells which directive was found. Comment lines are
+    # matched too, so directives in them are skipped.
     # Don't change ``crt`` to ``bind``, it should match the ``server`` And
     # ``default-server`` directives too!
-    FIND_WORDS = {
-        'stats': re.compile(r'socket\s+' + PATH_PATTERN),
-        'crt': re.compile(r'crt\s+' + PATH_PATTERN),
-        'crt-base': re.compile(r'crt-base\s+' + PATH_PATTERN)
-    }
+    PAT_DIRECTIVES = re.compile(
+        r'^[ \t]*#.*$'
+        r'|(?:(?P<stats>stats[ \t]+socket)|(?P<crt_base>crt-base)|crt)'
+        r'[ \t]+(?P<path>' + PATH_PATTERN + r')',
+        re.MULTILINE
+    )
+
+    #: The directives in ``PAT_DIRECTIVES``.
+    FIND_WORDS = ('stats', 'crt', 'crt-base')
 
     def __init__(self, conf_files):
         """
@@ -108,30 +119,46 @@ class HAProxyParser(object):
         """
         Start the parsing process and returns cert and socket paths.
 
+        Config files are parsed in a thread pool because parsing them is
+        mostly waiting for disk I/O. The results are kept in the order of
+        ``self.conf_files``.
+
         :return tuple: Tuple containing lists of paths and corresponding
             sockets.
         """
         socket_paths = []
         cert_paths = []
-        for conf_file in self.conf_files:
-            # Get relevant lines from all config files.
-            relevant_lines = self._parse_relevant_lines(conf_file)
-            # Parse all sockets from the relevant lines.
-            socket_paths.append(
-                self._parse_haproxy_sockets(relevant_lines['stats'])
-            )
-            # Find out if a crt-base is set. `crt` directives depend on that
-            # value so we need to find it first. We assume crt-base can only be
-            # set once.
-            cert_base = self._parse_haproxy_cert_base(
-                relevant_lines['crt-base']
-            )
-            cert_paths.append(
-                self._parse_haproxy_cert_paths(
-                    relevant_lines['crt'],
-                    cert_base
-                )
-            )
+        if not self.conf_files:
+            return (cert_paths, socket_paths)
+        max_workers = min(MAX_PARSER_THREADS, len(self.conf_files))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(self._parse_conf_file, self.conf_files)
+            for conf_cert_paths, conf_socket_paths in results:
+                cert_paths.append(conf_cert_paths)
+                socket_paths.append(conf_socket_paths)
+        return (cert_paths, socket_paths)
+
+    @classmethod
+    def _parse_conf_file(cls, conf_file):
+        """
+        Parse a single config file and return its cert and socket paths.
+
+        :param str conf_file: HAProxy config file path
+        :return tuple: Tuple containing a list of cert paths and a list of
+            sockets.
+        """
+        # Get relevant lines from the config file.
+        relevant_lines = cls._parse_relevant_lines(conf_file)
+        # Parse all sockets from the relevant lines.
+        socket_paths = cls._parse_haproxy_sockets(relevant_lines['stats'])
+        # Find out if a crt-base is set. `crt` directives depend on that
+        # value so we need to find it first. We assume crt-base can only be
+        # set once.
+        cert_base = cls._parse_haproxy_cert_base(relevant_lines['crt-base'])
+        cert_paths = cls._parse_haproxy_cert_paths(
+            relevant_lines['crt'],
+            cert_base
+        )
         return (cert_paths, socket_paths)
 
     @classmethod
@@ -139,31 +166,37 @@ class HAProxyParser(object):
         """
         Parse config file, return dict of relevant lines per directive.
 
-        Only the directives in ``FIND_WORDS`` are parsed.
+        Only the directives in ``FIND_WORDS`` are parsed, using
+        ``PAT_DIRECTIVES`` on the contents of the whole file.
 
         :param str conf_file_path: HAProxy config file path
         """
         # Make a dictionary with the keys of find_words corresponding with
         # empty array as a place holder.
         relevant_lines = dict([(word, []) for word in cls.FIND_WORDS])
+        # Config files are small, read them at once and scan the whole text
+        # instead of going through the file line by line.
+        with open(conf_file_path, 'r') as config:
+            data = config.read()
+        # All directives contain ``crt`` or ``stats``, skip scanning files
+        # without them, e.g. files with only global or default settings.
+        if 'crt' not in data and 'stats' not in data:
+            return relevant_lines
         # Now locate the relevant lines in this file and keep the found
         # pattern matches.
-        with open(conf_file_path, 'r') as config:
-            for line in config:
-                # Strip whitespaces
-                line = line.strip(" \t")
+        for match in cls.PAT_DIRECTIVES.finditer(data):
+            path = match.group('path')
+            if path is None:
                 # Skip comment lines..
-                if line.startswith('#'):
-                    continue
-                for word, pattern in cls.FIND_WORDS.items():
-                    if "{} ".format(word) not in line:
-                        continue
-                    matches = pattern.findall(line)
-                    if matches:
-                        # We only need the first capturing group.
-                        matches = [match[0].strip(" \t") for match in matches]
-                        # We will only need the matched strings later on.
-                        relevant_lines[word] += matches
+                continue
+            if match.group('stats'):
+                word = 'stats'
+            elif match.group('crt_base'):
+                word = 'crt-base'
+            else:
+                word = 'crt'
+            # We will only need the matched strings later on.
+            relevant_lines[word].append(path.strip(" \t"))
         return relevant_lines
 
     @staticmethod
@@ -206,6 +239,10 @@ class HAProxyParser(object):
         :returns list: Cert paths.
         """
         abs_cert_paths = []
+        # Same as ``os.path.join(cert_base, path)`` for relative paths, HAProxy
+        # only runs on POSIX systems so absolute paths start with a slash.
+        if cert_base and not cert_base.endswith('/'):
+            cert_base += '/'
         for path in cert_paths_lines:
             if path.startswith("'"):
                 # Strong quoted, only remove quotes.
@@ -213,12 +250,11 @@ class HAProxyParser(object):
             else:
                 # Weak, or not quoted, remove quotes and unescape spaces.
                 path = cls.PAT_UNESCAPE.sub("\\1", path.strip('"'))
-            if not os.path.isabs(path):
-                path = os.path.join(cert_base, path)
+            if not path.startswith('/'):
+                path = cert_base + path
             abs_cert_paths.append(path)
-            # de-dupe the cert paths
-            abs_cert_paths = unique(abs_cert_paths)
-        return abs_cert_paths
+        # de-dupe the cert paths
+        return unique(abs_cert_paths)
 
 
 def parse_haproxy_config(conf_files):
@@ -0,0 +1,164 @@
+"""
+A minimal wrapper around the Linux inotify API using :mod:`ctypes`.
+
+Only what stapled needs to be notified of changes in certificate paths is
+implemented, so no extra dependency is needed. On systems without inotify
+:class:`INotify` raises an :exc:`OSError` so callers can fall back to
+polling.
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+from collections import namedtuple
+
+# Event masks from ``<sys/inotify.h>``.
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+#: Flag for ``inotify_init1``, same value as ``O_CLOEXEC``.
+IN_CLOEXEC = 0o2000000
+
+#: Header of an event, followed by a null padded name of ``length`` bytes.
+EVENT_HEADER = struct.Struct('iIII')
+
+#: Enough room for a few hundred events per read.
+READ_SIZE = 64 * 1024
+
+#: A single inotify event, ``name`` is empty for events on the watched path
+#: itself.
+Event = namedtuple('Event', ['wd', 'mask', 'cookie', 'name'])
+
+
+def _load_libc():
+    """
+    Load the C library and check that it supports inotify.
+
+    :return ctypes.CDLL: The C library.
+    :raises OSError: If inotify is not available.
+    """
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    for func in ('inotify_init1', 'inotify_add_watch'):
+        if not hasattr(libc, func):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+    return libc
+
+
+def _raise_errno(path=None):
+    """Raise an :exc:`OSError` for the errno of the last C library call."""
+    err = ctypes.get_errno()
+    raise OSError(err, os.strerror(err), path)
+
+
+class INotify(object):
+    """
+    An inotify instance that reports changes in watched paths.
+
+    .. code::
+
+        inotify = INotify()
+        inotify.add_watch('/etc/ssl/private', IN_CREATE | IN_DELETE)
+        for event in inotify.read():
+            print(event.name)
+
+    A thread that waits in :meth:`read` can be woken from another thread with
+    :meth:`interrupt`, after that the instance can be closed safely.
+    """
+
+    def __init__(self):
+        """
+        Initialise the inotify instance.
+
+        :raises OSError: If inotify is not available or no more inotify
+            instances can be created.
+        """
+        self._libc = _load_libc()
+        self.fd = self._libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            _raise_errno()
+        self.interrupted = False
+        # Written to by interrupt() to wake up a thread that waits in read().
+        self._wake_read, self._wake_write = os.pipe()
+
+    @property
+    def closed(self):
+        """Whether :meth:`close` was called."""
+        return self.fd is None
+
+    def add_watch(self, path, mask):
+        """
+        Watch a path for events, or change the events of an existing watch.
+
+        Symlinks are followed.
+
+        :param str path: The file or directory to watch.
+        :param int mask: The events to watch for, e.g. ``IN_CREATE``.
+        :return int: Watch descriptor, it is reported in events for this path.
+        :raises OSError: If the path can't be watched, e.g. because it
+            doesn't exist or because the watch limit is reached.
+        """
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            _raise_errno(path)
+        return wd
+
+    def read(self):
+        """
+        Wait for events and return them.
+
+        :return list: :class:`Event` tuples, empty if :meth:`interrupt` was
+            called.
+        :raises OSError: If the instance was closed.
+        """
+        if self.fd is None:
+            raise OSError(errno.EBADF, "inotify instance is closed")
+        if self.interrupted:
+            return []
+        readable = select.select([self.fd, self._wake_read], [], [])[0]
+        if self._wake_read in readable:
+            return []
+        data = os.read(self.fd, READ_SIZE)
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            events.append(Event(wd, mask, cookie, os.fsdecode(name)))
+        return events
+
+    def interrupt(self):
+        """
+        Make :meth:`read` return an empty list, now and from now on.
+
+        Wakes up a thread that is waiting in :meth:`read`.
+        """
+        if not self.interrupted:
+            self.interrupted = True
+            os.write(self._wake_write, b'\0')
+
+    def close(self):
+        """
+        Close the instance, all watches are removed.
+
+        Don't close the instance while another thread may be reading from it,
+        :meth:`interrupt` the thread and wait for it to stop first.
+        """
+        if self.fd is not None:
+            fd, self.fd = self.fd, None
+            os.close(fd)
+            os.close(self._wake_read)
+            os.close(self._wake_write)
@@ -20,13 +20,19 @@ class OCSPResponseParser(object):
         self.response = getattr(ocsp_object, 'response_data')
         # SingleResponse object should be in these keys
         self.tbsresponse = self.response['responses'][0]
+        # Derived data, the response doesn't change so it is computed once.
+        self._base64 = None
+        self._valid_from = None
+        self._valid_until = None
 
     @property
     def base64(self):
         """
         Return the staple data in base64 form.
         """
-        return base64(self.raw.dump())
+        if self._base64 is None:
+            self._base64 = base64(self.raw.dump())
+        return self._base64
 
     @property
     def status(self):
@@ -58,10 +64,12 @@ class OCSPResponseParser(object):
         Short-cut for the parsed valid_from field.
         :returns datetime.datetime: Date from which the staple is valid.
         """
-        return datetime.datetime.strptime(
-            str(self.tbsresponse['this_update']),
-            "%Y%m%d%H%M%SZ"
-        )
+        if self._valid_from is None:
+            self._valid_from = datetime.datetime.strptime(
+                str(self.tbsresponse['this_update']),
+                "%Y%m%d%H%M%SZ"
+            )
+        return self._valid_from
 
     @property
     def valid_until(self):
@@ -69,7 +77,9 @@ class OCSPResponseParser(object):
         Short-cut for the parsed valid_until field.
         :returns datetime.datetime: Date until which the staple is valid.
         """
-        return datetime.datetime.strptime(
-            str(self.tbsresponse['next_update']),
-            "%Y%m%d%H%M%SZ"
-        )
+        if self._valid_until is None:
+            self._valid_until = datetime.datetime.strptime(
+                str(self.tbsresponse['next_update']),
+                "%Y%m%d%H%M%SZ"
+            )
+        return self._valid_until
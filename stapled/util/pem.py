@@ -0,0 +1,55 @@
+"""
+Decode PEM encoded data such as certificate files.
+
+This does the same as ``asn1crypto.pem.unarmor(data, multiple=True)`` but
+finds the PEM blocks with a regular expression and decodes each block with a
+single base64 decode, instead of building the base64 data line by line.
+"""
+import binascii
+import re
+
+#: Matches a PEM block, the type in the END line must match the BEGIN line.
+PEM_BLOCK = re.compile(
+    br'-----BEGIN ([A-Z0-9 ]+)-----(.*?)-----END \1-----',
+    re.DOTALL
+)
+
+
+def unarmor(data):
+    """
+    Decode all PEM blocks in ``data``.
+
+    Anything outside of the PEM blocks is ignored.
+
+    :param bytes data: PEM encoded data with one or more blocks.
+    :return generator: Tuples of the block type (e.g. ``"CERTIFICATE"``), a
+        dict with the block's headers and the DER encoded bytes.
+    :raises ValueError: If ``data`` contains no PEM blocks.
+    :raises binascii.Error: If a block contains invalid base64 data.
+    """
+    found = False
+    for match in PEM_BLOCK.finditer(data):
+        found = True
+        body = match.group(2)
+        if b':' not in body:
+            # No headers, which is the case for certificates. The decoder
+            # skips the line breaks itself.
+            yield match.group(1).decode('ascii'), {}, binascii.a2b_base64(body)
+            continue
+        headers = {}
+        lines = []
+        for line in body.splitlines():
+            if b':' in line:
+                # Headers such as "Proc-Type: 4,ENCRYPTED" in encrypted keys.
+                name, _, value = line.partition(b':')
+                headers[name.strip().decode('ascii')] = \
+                    value.strip().decode('ascii')
+            else:
+                lines.append(line.strip())
+        yield (
+            match.group(1).decode('ascii'),
+            headers,
+            binascii.a2b_base64(b''.join(lines))
+        )
+    if not found:
+        raise ValueError("Data does not contain any PEM blocks.")